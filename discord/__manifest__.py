@@ -9,6 +9,8 @@
         'security/ir.model.access.csv',
         'data/discord_command_data.xml',
         'data/message_template_data.xml',
+        'data/ir_sequence_data.xml',
+        'data/ir_cron_data.xml',
         'views/menu.xml',
         'views/res_config.xml',
         'views/res_partner.xml',
@@ -19,6 +21,10 @@
         'views/payment_templates.xml',
         'views/points_order.xml',
         'views/points_gift.xml',
+        'views/points_ledger.xml',
+        'views/payment_callback.xml',
+        'views/dm_outbox.xml',
+        'views/announce_job.xml',
     ],
     "external_dependencies": {
         "python": ['discord', 'jinja2'],
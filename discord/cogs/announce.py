@@ -1,11 +1,7 @@
 import logging
 import re
 
-# noinspection PyUnresolvedReferences
-from discord.ext import commands
-
 from .base import BaseCog
-from ..services.dm_queue import DMPriority
 
 _logger = logging.getLogger(__name__)
 
@@ -14,23 +10,10 @@ class AnnounceCog(BaseCog):
     """群發通知指令"""
 
     channel_type = 'announce'
+    command_type = 'announce'
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽訊息，處理群發通知指令"""
-        if message.author.bot:
-            return
-
-        # 解析是否為 announce 指令
-        is_match, cmd_name, args = self.parse_command(message.content, 'announce')
-        if not is_match:
-            return
-
-        # 檢查頻道權限
-        allowed = self.get_allowed_channels(self.channel_type)
-        if allowed and len(allowed) > 0 and message.channel.id not in allowed:
-            return
-
+    async def handle_command(self, message, cmd_name: str, args: list):
+        """處理群發通知指令（由指令路由呼叫）"""
         await self._handle_announce(message, args)
 
     async def _handle_announce(self, message, args):
@@ -55,7 +38,7 @@ class AnnounceCog(BaseCog):
             return
 
         # 檢查發送者是否有允許的身分組
-        has_permission = await self._check_permission(message)
+        has_permission = self._check_permission(message)
         if not has_permission:
             _logger.warning(f"使用者 {message.author} 無權使用 announce 指令")
             return
@@ -70,66 +53,54 @@ class AnnounceCog(BaseCog):
             _logger.warning(f"找不到身分組: {role_id}")
             return
 
-        # 預先渲染模板（只查一次 DB）
-        try:
-            with self.odoo_env() as env:
-                announce_result = env['discord.message.template'].render_message_by_type(
-                    'announce',
-                    {
-                        'message': announce_message,
-                        'role_name': role.name,
-                        'sender': f"<@{message.author.id}>",
-                        'guild_name': guild.name,
-                    }
-                )
-        except Exception as e:
-            _logger.error(f"渲染群發通知模板失敗: {e}")
-            return
-
+        # 渲染模板（設定快照）並建立群發任務，實際發送由 AnnounceJobRunner 分批執行
+        announce_result = self.config.render_message('announce', {
+            'message': announce_message,
+            'role_name': role.name,
+            'sender': f"<@{message.author.id}>",
+            'guild_name': guild.name,
+        })
         if not announce_result:
             _logger.warning("找不到 announce 模板或渲染失敗")
             return
 
-        # 逐一私訊成員
-        members = [m for m in role.members if not m.bot]
-        total = len(members)
-        success = 0
-        failed = 0
-
-        for member in members:
-            try:
-                future = await self.bot.dm_queue.enqueue(
-                    member, priority=DMPriority.LOW, **announce_result
-                )
-                await future
-                success += 1
-            except Exception as e:
-                _logger.error(f"發送群發通知給 {member} 失敗: {e}")
-                failed += 1
-
-        # 回報結果給發送者
+        members = [m.id for m in role.members if not m.bot]
         try:
-            with self.odoo_env() as env:
-                result = env['discord.message.template'].render_message_by_type(
-                    'announce_result',
-                    {
-                        'role_name': role.name,
-                        'total': total,
-                        'success': success,
-                        'failed': failed,
-                    }
-                )
-            if result:
-                await self.send_dm(message.author, **result)
+            await self.run_in_odoo(
+                self._create_job,
+                f"{guild.name} · {role.name}",
+                announce_result,
+                members,
+                guild.id,
+                role.id,
+                role.name,
+                message.author.id,
+            )
         except Exception as e:
-            _logger.error(f"發送群發結果通知失敗: {e}")
+            _logger.error(f"建立群發任務失敗: {e}")
+            return
 
-    async def _check_permission(self, message) -> bool:
+        await self.bot.announce_jobs.sync()
+
+    @staticmethod
+    def _create_job(env, name: str, announce_result: dict, member_ids: list, guild_id: int,
+                    role_id: int, role_name: str, author_id: int) -> int:
+        """建立群發任務（於 Odoo 線程池執行）"""
+        job = env['discord.announce.job'].create_job(
+            name,
+            announce_result,
+            member_ids,
+            guild_id=guild_id,
+            role_id=role_id,
+            role_name=role_name,
+            author_discord_id=author_id,
+        )
+        return job.id
+
+    def _check_permission(self, message) -> bool:
         """檢查發送者是否擁有允許使用 announce 的身分組"""
         try:
-            with self.odoo_env() as env:
-                config = env['ir.config_parameter'].sudo()
-                allowed_roles_str = config.get_param('discord.announce_allowed_roles', '')
+            allowed_roles_str = self.config.get_param('discord.announce_allowed_roles', '')
 
             if not allowed_roles_str:
                 # 未設定允許身分組，不允許任何人使用
@@ -1,137 +1,62 @@
 import logging
-import time
-from contextlib import contextmanager
 # noinspection PyUnresolvedReferences
 from discord.ext import commands
 # noinspection PyUnresolvedReferences
 from discord.ext.commands import CheckFailure
 
-import odoo
-from odoo import api
-from odoo.modules.registry import Registry
+from ..services.odoo_executor import odoo_env
 
 _logger = logging.getLogger(__name__)
 
-# 快取過期時間（秒）- 設為 60 秒，確保設定變更後最多 60 秒內生效
-CACHE_TTL = 60
-
 
 class BaseCog(commands.Cog):
     """所有 Cog 的基礎類別，提供共用的 Odoo 操作方法"""
 
     # 子類別設定此屬性來指定頻道類型，None 表示不檢查
     channel_type = None
+    # 子類別設定此屬性來指定處理的指令行為類型（discord.command.config 的 command_type）
+    command_type = None
 
     def __init__(self, bot, db_name: str):
         self.bot = bot
         self._db_name = db_name
-        self._channel_cache = {}
-        self._command_cache = {}
-        self._cache_time = {}
-
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """檢查快取是否仍有效"""
-        if cache_key not in self._cache_time:
-            return False
-        return (time.time() - self._cache_time[cache_key]) < CACHE_TTL
-
-    def get_allowed_channels(self, channel_type: str) -> list | None:
-        """根據類型從 Odoo 取得允許的頻道列表，失敗時返回 None"""
-        cache_key = f'channel_{channel_type}'
-
-        # 檢查快取是否有效
-        if channel_type in self._channel_cache and self._is_cache_valid(cache_key):
-            return self._channel_cache[channel_type]
-
-        try:
-            with self.odoo_env() as env:
-                if 'discord.channel.config' not in env:
-                    # 模型不存在（模組未升級）
-                    _logger.warning("discord.channel.config 模型不存在，跳過頻道檢查")
-                    self._channel_cache[channel_type] = None
-                else:
-                    channels = env['discord.channel.config'].get_channels_by_type(channel_type)
-                    self._channel_cache[channel_type] = channels
-                self._cache_time[cache_key] = time.time()
-        except Exception as e:
-            _logger.error(f"取得允許頻道失敗: {e}")
-            self._channel_cache[channel_type] = None
-            self._cache_time[cache_key] = time.time()
-
-        return self._channel_cache[channel_type]
-
-    def clear_channel_cache(self):
-        """清除頻道快取（設定變更時呼叫）"""
-        self._channel_cache = {}
-        # 只清除頻道相關的快取時間
-        for key in list(self._cache_time.keys()):
-            if key.startswith('channel_'):
-                del self._cache_time[key]
-
-    def clear_command_cache(self):
-        """清除指令快取（設定變更時呼叫）"""
-        self._command_cache = {}
-        # 只清除指令相關的快取時間
-        for key in list(self._cache_time.keys()):
-            if key.startswith('command_'):
-                del self._cache_time[key]
-
-    def get_command_names(self, command_type: str) -> list:
-        """根據行為類型從 Odoo 取得指令名稱列表"""
-        cache_key = f'command_{command_type}'
-
-        if command_type in self._command_cache and self._is_cache_valid(cache_key):
-            return self._command_cache[command_type]
-
-        try:
-            with self.odoo_env() as env:
-                if 'discord.command.config' not in env:
-                    _logger.warning("discord.command.config 模型不存在")
-                    self._command_cache[command_type] = []
-                else:
-                    commands = env['discord.command.config'].get_commands_by_type(command_type)
-                    self._command_cache[command_type] = commands
-                self._cache_time[cache_key] = time.time()
-        except Exception as e:
-            _logger.error(f"取得指令設定失敗: {e}")
-            self._command_cache[command_type] = []
-            self._cache_time[cache_key] = time.time()
-
-        return self._command_cache[command_type]
-
-    def parse_command(self, message_content: str, command_type: str) -> tuple:
-        """
-        解析訊息是否為指定類型的指令
-        返回: (是否匹配, 指令名稱, 參數列表)
-        """
-        if not message_content.startswith('!'):
-            return False, None, []
 
-        parts = message_content[1:].split()
-        if not parts:
-            return False, None, []
+    @property
+    def config(self):
+        """目前的 Bot 設定快照（ConfigSnapshot，不可變，免加鎖讀取）"""
+        return self.bot.config_store.snapshot
 
-        cmd_name = parts[0].lower()
-        args = parts[1:]
+    def get_allowed_channels(self, channel_type: str) -> frozenset:
+        """根據類型取得允許的頻道，空集合表示允許全部"""
+        return self.config.allowed_channels(channel_type)
 
-        # 檢查是否為此類型的指令
-        allowed_commands = self.get_command_names(command_type)
-        if cmd_name in [c.lower() for c in allowed_commands]:
-            return True, cmd_name, args
-
-        return False, None, []
-
-    async def cog_check(self, ctx):
-        """所有指令執行前的檢查 - 驗證頻道"""
+    def is_channel_allowed(self, channel_id: int) -> bool:
+        """檢查頻道是否允許執行此 Cog 的指令（未設定頻道表示允許全部）"""
         if not self.channel_type:
             return True
 
         allowed = self.get_allowed_channels(self.channel_type)
-        # None 或空列表表示允許全部頻道
-        if allowed is None or len(allowed) == 0:
+        if not allowed:
             return True
 
-        return ctx.channel.id in allowed
+        return channel_id in allowed
+
+    async def handle_command(self, message, cmd_name: str, args: list):
+        """
+        處理指令，由 DiscordBotService 的指令路由呼叫
+
+        子類別設定 command_type 並覆寫此方法。
+        路由已完成指令解析與頻道權限檢查。
+
+        :param message: discord.Message
+        :param cmd_name: 指令名稱（小寫，不含前綴）
+        :param args: 參數列表
+        """
+        raise NotImplementedError
+
+    async def cog_check(self, ctx):
+        """所有指令執行前的檢查 - 驗證頻道"""
+        return self.is_channel_allowed(ctx.channel.id)
 
     async def cog_command_error(self, ctx, error):
         """處理指令錯誤 - 靜默忽略頻道檢查失敗"""
@@ -141,20 +66,25 @@ class BaseCog(commands.Cog):
         # 其他錯誤繼續拋出
         raise error
 
-    @contextmanager
     def odoo_env(self):
-        """Context manager 取得 Odoo Environment，自動處理 commit/close"""
-        reg = Registry(self._db_name)
-        cr = reg.cursor()
-        try:
-            env = api.Environment(cr, odoo.SUPERUSER_ID, {})
-            yield env
-            cr.commit()
-        except Exception:
-            cr.rollback()
-            raise
-        finally:
-            cr.close()
+        """
+        Context manager 取得 Odoo Environment，自動處理 commit/close
+
+        注意：會在呼叫端線程同步執行，於 event loop 中請改用 run_in_odoo()
+        """
+        return odoo_env(self._db_name)
+
+    async def run_in_odoo(self, fn, *args):
+        """
+        在 Odoo 線程池中執行 fn(env, *args)，不阻塞 Discord event loop
+
+        每次呼叫使用獨立 cursor，成功時 commit、例外時 rollback。
+        fn 內請勿 await 或操作 Discord 物件，只回傳需要的資料。
+
+        :param fn: 同步函式，第一個參數為 env
+        :return: fn 的回傳值
+        """
+        return await self.bot.odoo_executor.run(fn, *args)
 
     async def send_dm(self, recipient, priority=None, **kwargs):
         """透過集中式 DM 佇列發送私訊"""
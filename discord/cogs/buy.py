@@ -1,10 +1,11 @@
 import logging
+import secrets
+import time
 
 import discord
-# noinspection PyUnresolvedReferences
-from discord.ext import commands
 
 from .base import BaseCog
+from ..services import payment_token
 
 _logger = logging.getLogger(__name__)
 
@@ -25,24 +26,10 @@ class BuyCog(BaseCog):
     """購買點數相關指令"""
 
     channel_type = 'buy'
+    command_type = 'buy'
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽訊息，處理動態指令"""
-        if message.author.bot:
-            return
-
-        # 解析是否為購買指令
-        is_match, cmd_name, args = self.parse_command(message.content, 'buy')
-        if not is_match:
-            return
-
-        # 檢查頻道權限
-        allowed = self.get_allowed_channels(self.channel_type)
-        if allowed and len(allowed) > 0 and message.channel.id not in allowed:
-            return
-
-        # 處理指令
+    async def handle_command(self, message, cmd_name: str, args: list):
+        """處理購買指令（由指令路由呼叫）"""
         await self._handle_buy(message, args)
 
     async def _handle_buy(self, message, args):
@@ -62,19 +49,15 @@ class BuyCog(BaseCog):
         discord_user_id = str(message.author.id)
 
         try:
-            # 產生付款連結
-            payment_url = self._generate_payment_url(discord_user_id, amount)
-
-            if not payment_url:
-                return
-
-            # 使用模板渲染訊息
-            with self.odoo_env() as env:
-                result = env['discord.message.template'].render_message_by_type(
-                    'buy_confirm', {'points': amount}
-                )
+            # 產生簽章付款連結並渲染訊息（皆讀取設定快照，不需存取資料庫）
+            # 每個付款連結各自的 nonce，重複 !buy 不會互相覆蓋
+            nonce = secrets.token_urlsafe(16)
+            expires_at = int(time.time()) + payment_token.TOKEN_TTL
+            payment_url, result = self._prepare_buy(
+                discord_user_id, amount, nonce, expires_at, message.author.display_name,
+            )
 
-            if not result:
+            if not payment_url or not result:
                 return
 
             # 私訊給使用者（使用按鈕）
@@ -84,36 +67,47 @@ class BuyCog(BaseCog):
                 view=PaymentView(payment_url, amount),
             )
 
-            # 暫存訊息資訊，用於付款成功後刪除
-            self._store_payment_message_info(
-                discord_user_id,
-                str(dm_message.id),
-                str(dm_message.channel.id)
+            # 記錄訊息位置，建立訂單時以 nonce 取回，付款成功後刪除
+            await self.run_in_odoo(
+                self._register_payment_link,
+                nonce, discord_user_id, str(dm_message.id), str(dm_message.channel.id), expires_at,
             )
 
         except Exception as e:
             _logger.error(f"購買點數失敗: {e}")
 
-    def _generate_payment_url(self, discord_user_id: str, amount: int) -> str | None:
-        """產生付款連結"""
-        try:
-            with self.odoo_env() as env:
-                base_url = env['ir.config_parameter'].sudo().get_param('web.base.url')
-                return f"{base_url}/discord/pay?discord_id={discord_user_id}&points={amount}"
-        except Exception as e:
-            _logger.error(f"產生付款連結失敗: {e}")
-            return None
-
-    def _store_payment_message_info(self, discord_user_id: str, message_id: str, channel_id: str):
+    def _prepare_buy(self, discord_user_id: str, amount: int, nonce: str,
+                     expires_at: int, display_name: str) -> tuple:
+        """產生付款連結並渲染確認訊息"""
+        payment_url = self._generate_payment_url(discord_user_id, amount, nonce, expires_at, display_name)
+        if not payment_url:
+            return None, None
+        result = self.config.render_message(
+            'buy_confirm', {'points': amount}
+        )
+        return payment_url, result
+
+    def _generate_payment_url(self, discord_user_id: str, amount: int, nonce: str,
+                              expires_at: int, display_name: str) -> str | None:
         """
-        暫存付款連結訊息資訊到 bot service
+        產生簽章付款連結
 
-        當訂單建立時會從這裡取得訊息資訊並存入訂單
+        連結內含 discord_id、點數、目前單價、nonce 與到期時間，
+        付款頁面只需驗證簽章，不需再查詢用戶與單價。
         """
         try:
-            from ..services.discord_bot import discord_bot_service
-            discord_bot_service.store_pending_payment_message(
-                discord_user_id, message_id, channel_id
+            base_url = self.config.get_param('web.base.url')
+            key = payment_token.derive_key(self.config.get_param('database.secret'))
+            price = int(self.config.get_param('discord.point_price', 10))
+            token = payment_token.sign(
+                key, discord_user_id, amount, price, nonce, expires_at, display_name,
             )
+            return f"{base_url}/discord/pay?t={token}"
         except Exception as e:
-            _logger.error(f"暫存付款連結訊息資訊失敗: {e}")
+            _logger.error(f"產生付款連結失敗: {e}")
+            return None
+
+    @staticmethod
+    def _register_payment_link(env, nonce: str, discord_user_id: str, message_id: str,
+                               channel_id: str, expires_at: int):
+        env['discord.payment.link'].register(nonce, discord_user_id, message_id, channel_id, expires_at)
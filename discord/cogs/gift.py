@@ -1,10 +1,8 @@
 import logging
 import re
 
-# noinspection PyUnresolvedReferences
-from discord.ext import commands
-
 from .base import BaseCog
+from ..services.rate_limit import retry_rate_limited
 
 _logger = logging.getLogger(__name__)
 
@@ -13,24 +11,10 @@ class GiftCog(BaseCog):
     """點數贈送指令"""
 
     channel_type = 'gift'
+    command_type = 'gift'
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽訊息，處理動態指令"""
-        if message.author.bot:
-            return
-
-        # 解析是否為贈送指令
-        is_match, cmd_name, args = self.parse_command(message.content, 'gift')
-        if not is_match:
-            return
-
-        # 檢查頻道權限
-        allowed = self.get_allowed_channels(self.channel_type)
-        if allowed and len(allowed) > 0 and message.channel.id not in allowed:
-            return
-
-        # 處理指令
+    async def handle_command(self, message, cmd_name: str, args: list):
+        """處理贈送指令（由指令路由呼叫）"""
         await self._handle_gift(message, args)
 
     async def _handle_gift(self, message, args):
@@ -68,71 +52,83 @@ class GiftCog(BaseCog):
         note = ' '.join(args[2:]) if len(args) > 2 else None
 
         try:
-            with self.odoo_env() as env:
-                success, msg, gift = env['discord.points.gift'].create_gift(
-                    sender_discord_id=sender_discord_id,
-                    receiver_discord_id=receiver_discord_id,
-                    points=points,
-                    note=note,
-                )
+            success, msg, result, announcement = await self.run_in_odoo(
+                self._create_gift,
+                sender_discord_id, receiver_discord_id, points, note,
+            )
 
-                if success:
-                    # 取得贈送者最新點數
-                    sender = self.get_partner_by_discord_id(env, sender_discord_id)
-
-                    result = env['discord.message.template'].render_message_by_type(
-                        'gift_success',
-                        {
-                            'points': points,
-                            'receiver': f"<@{receiver_discord_id}>",
-                            'remaining_points': sender.points,
-                        }
-                    )
-                    if result:
-                        await self.send_dm(message.author, **result)
-
-                    # 發送公告
-                    await self._send_announcement(
-                        env,
-                        sender_discord_id=sender_discord_id,
-                        receiver_discord_id=receiver_discord_id,
-                        points=points,
-                        note=note,
-                    )
-                else:
-                    # 贈送失敗，私訊錯誤訊息
-                    await self.send_dm(message.author, content=msg)
+            if success:
+                if result:
+                    await self.send_dm(message.author, **result)
+
+                # 發送公告
+                if announcement:
+                    await self._send_announcement(*announcement)
+            else:
+                # 贈送失敗，私訊錯誤訊息
+                await self.send_dm(message.author, content=msg)
 
         except Exception as e:
             _logger.error(f"贈送點數失敗: {e}")
 
-    async def _send_announcement(self, env, sender_discord_id: str, receiver_discord_id: str, points: int, note: str = None):
-        """發送贈送公告到指定頻道"""
+    def _create_gift(self, env, sender_discord_id: str, receiver_discord_id: str,
+                     points: int, note: str = None) -> tuple:
+        """
+        執行點數贈送並渲染回覆與公告訊息（於 Odoo 線程池執行）
+
+        :return: (success, message, 回覆 kwargs, (公告頻道 ID, 公告 kwargs) 或 None)
+        """
+        success, msg, gift = env['discord.points.gift'].create_gift(
+            sender_discord_id=sender_discord_id,
+            receiver_discord_id=receiver_discord_id,
+            points=points,
+            note=note,
+        )
+        if not success:
+            return False, msg, None, None
+
+        # 取得贈送者最新點數
+        sender = self.get_partner_by_discord_id(env, sender_discord_id)
+
+        result = self.config.render_message(
+            'gift_success',
+            {
+                'points': points,
+                'receiver': f"<@{receiver_discord_id}>",
+                'remaining_points': sender.points,
+            }
+        )
+
+        announcement = None
         try:
-            config = env['ir.config_parameter'].sudo()
-            channel_id = config.get_param('discord.gift_announcement_channel')
+            channel_id = self.config.get_param('discord.gift_announcement_channel')
+            if channel_id:
+                # 使用模板渲染公告
+                announce_result = self.config.render_message(
+                    'gift_announcement',
+                    {
+                        'sender': f"<@{sender_discord_id}>",
+                        'receiver': f"<@{receiver_discord_id}>",
+                        'points': points,
+                        'note': note,
+                    }
+                )
+                if announce_result:
+                    announcement = (int(channel_id), announce_result)
+        except Exception as e:
+            _logger.error(f"渲染贈送公告失敗: {e}")
 
-            if not channel_id:
-                return
+        return True, msg, result, announcement
 
-            channel = self.bot.get_channel(int(channel_id))
+    async def _send_announcement(self, channel_id: int, send_kwargs: dict):
+        """發送贈送公告到指定頻道"""
+        try:
+            channel = self.bot.get_channel(channel_id)
             if not channel:
                 _logger.warning(f"找不到公告頻道: {channel_id}")
                 return
 
-            # 使用模板渲染公告
-            result = env['discord.message.template'].render_message_by_type(
-                'gift_announcement',
-                {
-                    'sender': f"<@{sender_discord_id}>",
-                    'receiver': f"<@{receiver_discord_id}>",
-                    'points': points,
-                    'note': note,
-                }
-            )
-
-            if result:
-                await channel.send(**result)
+            await retry_rate_limited(channel.send, **send_kwargs)
 
         except Exception as e:
             _logger.error(f"發送贈送公告失敗: {e}")
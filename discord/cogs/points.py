@@ -1,8 +1,5 @@
 import logging
 
-# noinspection PyUnresolvedReferences
-from discord.ext import commands
-
 from .base import BaseCog
 
 _logger = logging.getLogger(__name__)
@@ -12,40 +9,28 @@ class PointsCog(BaseCog):
     """點數相關指令"""
 
     channel_type = 'points'
+    command_type = 'points'
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽訊息，處理動態指令"""
-        if message.author.bot:
-            return
-
-        # 解析是否為點數查詢指令
-        is_match, cmd_name, args = self.parse_command(message.content, 'points')
-        if not is_match:
-            return
-
-        # 檢查頻道權限
-        allowed = self.get_allowed_channels(self.channel_type)
-        if allowed and len(allowed) > 0 and message.channel.id not in allowed:
-            return
-
-        # 處理指令
+    async def handle_command(self, message, cmd_name: str, args: list):
+        """處理點數查詢指令（由指令路由呼叫）"""
         await self._handle_points(message)
 
     async def _handle_points(self, message):
         """處理點數查詢指令"""
         discord_user_id = str(message.author.id)
-        discord_username = message.author.name
 
         try:
-            with self.odoo_env() as env:
-                partner = self.get_partner_by_discord_id(env, discord_user_id)
-
-                if partner:
-                    result = env['discord.message.template'].render_message_by_type(
-                        'points_query', {'points': partner.points}
-                    )
-                    if result:
-                        await self.send_dm(message.author, **result)
+            result = await self.run_in_odoo(self._render_points_query, discord_user_id)
+            if result:
+                await self.send_dm(message.author, **result)
         except Exception as e:
             _logger.error(f"查詢點數失敗: {e}")
+
+    def _render_points_query(self, env, discord_user_id: str) -> dict | None:
+        """查詢點數並渲染回覆訊息（於 Odoo 線程池執行）"""
+        partner = self.get_partner_by_discord_id(env, discord_user_id)
+        if not partner:
+            return None
+        return self.config.render_message(
+            'points_query', {'points': partner.points}
+        )
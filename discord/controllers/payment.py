@@ -4,109 +4,146 @@ from datetime import datetime
 from odoo import http
 from odoo.http import request
 
+from ..services import payment_token
+
 _logger = logging.getLogger(__name__)
 
 
+class _CheckoutError(Exception):
+    """結帳失敗，用於回滾 savepoint"""
+
+
 # 4311-9511-1111-1111
 
 class DiscordPayment(http.Controller):
 
-    def _attach_payment_message_to_order(self, order, discord_id):
+    def _verify_payment_token(self, token):
+        """
+        驗證付款連結簽章
+
+        金鑰由 database.secret 衍生（get_param 有 ormcache），驗證不需查詢資料庫。
+
+        :return: PaymentToken，無效或過期時回傳 None
+        """
+        secret = request.env['ir.config_parameter'].sudo().get_param('database.secret')
+        if not secret:
+            return None
+        return payment_token.verify(payment_token.derive_key(secret), token)
+
+    def _create_order_from_token(self, token, payment_method: str, label: str, sdk):
+        """
+        以付款連結建立訂單與金流表單參數
+
+        標記付款連結已使用、建立訂單、產生金流參數在同一個 savepoint 中完成：
+        重複使用的連結最先被拒絕，後續任一步驟失敗時全部回滾，付款連結不會被消耗，
+        用戶可重試或改用其他付款方式。
+
+        :return: (order, 金流表單參數, error_message)
         """
-        將暫存的付款連結訊息資訊附加到訂單
+        try:
+            with request.env.cr.savepoint():
+                # 先標記付款連結已使用，重複使用的連結在任何 ORM 操作前即拒絕；
+                # 之後任一步驟失敗時 savepoint 回滾，標記一併撤銷，連結不會被消耗
+                if not request.env['discord.payment.link'].sudo().claim(
+                        token.nonce, token.discord_id, token.expires_at):
+                    raise _CheckoutError('此付款連結已使用，請重新使用 !buy 產生付款連結')
+
+                order = request.env['discord.points.order'].create_order(
+                    discord_id=token.discord_id,
+                    points=token.points,
+                    amount=token.amount,
+                    payment_method=payment_method,
+                )
+                if not order:
+                    raise _CheckoutError('建立訂單失敗，請確認帳號已綁定')
+
+                base_url = request.env['ir.config_parameter'].sudo().get_param('web.base.url')
+                order_params = {
+                    'MerchantTradeNo': order.name,
+                    'MerchantTradeDate': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
+                    'TotalAmount': token.amount,
+                    'TradeDesc': 'Discord點數購買',
+                    'ItemName': f'Discord 點數 {token.points} 點',
+                    'ReturnURL': f'{base_url}/discord/pay/{payment_method}/callback',
+                    'ChoosePayment': 'ALL',
+                    'ClientBackURL': f'{base_url}/discord/pay/result?order={order.name}',
+                    'OrderResultURL': f'{base_url}/discord/pay/result?order={order.name}',
+                    'NeedExtraPaidInfo': 'N',
+                    'EncryptType': 1,
+                }
+                try:
+                    gateway_params = sdk.create_order(order_params)
+                except Exception as e:
+                    _logger.error(f"{label}訂單建立失敗: {e}")
+                    raise _CheckoutError(f'訂單建立失敗: {e}')
+        except _CheckoutError as e:
+            return None, None, str(e)
+
+        # 以付款連結的 nonce 取得訊息資訊並存入訂單
+        self._attach_payment_message_to_order(order, token.nonce)
+        return order, gateway_params, None
+
+    def _attach_payment_message_to_order(self, order, ref):
+        """
+        將付款連結訊息資訊附加到訂單
 
         :param order: 訂單記錄
-        :param discord_id: Discord 用戶 ID
+        :param ref: 付款連結中的 nonce
         """
         try:
-            from ..services.discord_bot import discord_bot_service
-
-            if not discord_bot_service.is_running:
-                return
-
-            message_info = discord_bot_service.get_pending_payment_message(discord_id)
-            if message_info:
-                order.sudo().write({
-                    'payment_message_id': message_info['message_id'],
-                    'payment_channel_id': message_info['channel_id'],
-                })
-                _logger.info(f"已將付款連結訊息資訊附加到訂單 {order.name}")
+            request.env['discord.payment.link'].sudo().attach_to_order(ref, order)
         except Exception as e:
             _logger.error(f"附加付款連結訊息資訊失敗: {e}")
 
-    @http.route('/discord/pay', auth='public', type='http')
-    def payment_page(self, discord_id=None, points=None, **kwargs):
-        """付款頁面 - 顯示付款選項"""
-        if not discord_id or not points:
-            return request.not_found()
+    def _handle_payment_callback(self, payment_method: str, label: str, params: dict) -> str:
+        """
+        驗證並寫入金流回調收件匣後立即回覆
 
+        入帳由 cron「Discord: 付款入帳」批次處理；重複送達的回調同樣回覆 1|OK。
+        """
+        _logger.info(f"{label}回調: {params}")
+
+        # 驗證 CheckMacValue
         try:
-            points = int(points)
-        except ValueError:
-            return request.not_found()
+            sdk = request.env['res.config.settings'].get_payment_sdk(payment_method)
+        except Exception as e:
+            _logger.error(f"取得{label} SDK 失敗: {e}")
+            return '0|SDK Error'
 
-        if points <= 0:
-            return request.not_found()
+        if not sdk.verify_check_value(params):
+            _logger.warning(f"{label}回調驗證失敗")
+            return '0|CheckMacValue Error'
 
-        # 檢查用戶是否存在
-        partner = request.env['res.partner'].sudo().search([
-            ('discord_id', '=', discord_id)
-        ], limit=1)
+        request.env['discord.payment.callback'].sudo().receive(payment_method, params)
+        return '1|OK'
 
-        if not partner:
+    @http.route('/discord/pay', auth='public', type='http')
+    def payment_page(self, t=None, **kwargs):
+        """付款頁面 - 顯示付款選項（只驗證簽章，不查詢資料庫）"""
+        token = self._verify_payment_token(t)
+        if token is None:
             return request.render('discord.payment_error', {
-                'error_message': '找不到此 Discord 帳號，請先使用 !bind 綁定帳號',
+                'error_message': '付款連結無效或已過期，請重新使用 !buy 產生付款連結',
             })
 
-        # 從設定讀取單價
-        config = request.env['ir.config_parameter'].sudo()
-        price_per_point = int(config.get_param('discord.point_price', 10))
-        total_amount = points * price_per_point
-
         return request.render('discord.payment_page', {
-            'discord_id': discord_id,
-            'partner': partner,
-            'points': points,
-            'price_per_point': price_per_point,
-            'total_amount': total_amount,
+            'token': t,
+            'display_name': token.display_name,
+            'points': token.points,
+            'price_per_point': token.price,
+            'total_amount': token.amount,
         })
 
     @http.route('/discord/pay/ecpay', auth='public', type='http')
-    def ecpay_checkout(self, discord_id=None, points=None, **kwargs):
+    def ecpay_checkout(self, t=None, **kwargs):
         """綠界付款 - 產生付款表單並自動提交"""
-        if not discord_id or not points:
-            return request.not_found()
-
-        try:
-            points = int(points)
-        except ValueError:
-            return request.not_found()
-
-        if points <= 0:
-            return request.not_found()
-
-        # 從設定讀取
-        config = request.env['ir.config_parameter'].sudo()
-        price_per_point = int(config.get_param('discord.point_price', 10))
-        total_amount = points * price_per_point
-
-        # 建立訂單
-        order = request.env['discord.points.order'].create_order(
-            discord_id=discord_id,
-            points=points,
-            amount=total_amount,
-            payment_method='ecpay'
-        )
-
-        if not order:
+        token = self._verify_payment_token(t)
+        if token is None:
             return request.render('discord.payment_error', {
-                'error_message': '建立訂單失敗，請確認帳號已綁定',
+                'error_message': '付款連結無效或已過期，請重新使用 !buy 產生付款連結',
             })
 
-        # 取得暫存的付款連結訊息資訊並存入訂單
-        self._attach_payment_message_to_order(order, discord_id)
-
-        # 取得綠界 SDK
+        # 取得綠界 SDK（先於建立訂單，設定錯誤時不消耗付款連結）
         try:
             sdk = request.env['res.config.settings'].get_ecpay_sdk()
         except Exception as e:
@@ -114,33 +151,16 @@ class DiscordPayment(http.Controller):
                 'error_message': str(e),
             })
 
-        action_url = f"{sdk.base_url}/Cashier/AioCheckOut/V5"
-        base_url = config.get_param('web.base.url')
-
-        order_params = {
-            'MerchantTradeNo': order.name,
-            'MerchantTradeDate': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
-            'TotalAmount': total_amount,
-            'TradeDesc': 'Discord點數購買',
-            'ItemName': f'Discord 點數 {points} 點',
-            'ReturnURL': f'{base_url}/discord/pay/ecpay/callback',
-            'ChoosePayment': 'ALL',
-            'ClientBackURL': f'{base_url}/discord/pay/result?order={order.name}',
-            'OrderResultURL': f'{base_url}/discord/pay/result?order={order.name}',
-            'NeedExtraPaidInfo': 'N',
-            'EncryptType': 1,
-        }
-
-        try:
-            ecpay_params = sdk.create_order(order_params)
-        except Exception as e:
-            _logger.error(f"綠界訂單建立失敗: {e}")
+        order, ecpay_params, error_message = self._create_order_from_token(
+            token, 'ecpay', '綠界', sdk
+        )
+        if not order:
             return request.render('discord.payment_error', {
-                'error_message': f'訂單建立失敗: {e}',
+                'error_message': error_message,
             })
 
         return request.render('discord.ecpay_form', {
-            'action_url': action_url,
+            'action_url': f"{sdk.base_url}/Cashier/AioCheckOut/V5",
             'params': ecpay_params,
         })
 
@@ -148,73 +168,18 @@ class DiscordPayment(http.Controller):
                 methods=['POST'], csrf=False)
     def ecpay_callback(self, **kwargs):
         """綠界付款回調 (Server to Server)"""
-        _logger.info(f"綠界回調: {kwargs}")
-
-        # 驗證 CheckMacValue
-        try:
-            sdk = request.env['res.config.settings'].get_ecpay_sdk()
-        except Exception as e:
-            _logger.error(f"取得綠界 SDK 失敗: {e}")
-            return '0|SDK Error'
-
-        check_mac = sdk.generate_check_value(kwargs)
-        if check_mac != kwargs.get('CheckMacValue'):
-            _logger.warning("綠界回調驗證失敗")
-            return '0|CheckMacValue Error'
-
-        # 檢查付款狀態
-        rtn_code = kwargs.get('RtnCode')
-        merchant_trade_no = kwargs.get('MerchantTradeNo')
-        trade_no = kwargs.get('TradeNo')
-
-        if rtn_code == '1':
-            # 付款成功
-            order = request.env['discord.points.order'].sudo().search([
-                ('name', '=', merchant_trade_no)
-            ], limit=1)
-
-            if order and order.state == 'pending':
-                order.mark_as_paid(trade_no)
-                _logger.info(f"訂單 {merchant_trade_no} 付款成功，加點 {order.points}")
-
-        return '1|OK'
+        return self._handle_payment_callback('ecpay', '綠界', kwargs)
 
     @http.route('/discord/pay/opay', auth='public', type='http')
-    def opay_checkout(self, discord_id=None, points=None, **kwargs):
+    def opay_checkout(self, t=None, **kwargs):
         """歐富寶付款 - 產生付款表單並自動提交"""
-        if not discord_id or not points:
-            return request.not_found()
-
-        try:
-            points = int(points)
-        except ValueError:
-            return request.not_found()
-
-        if points <= 0:
-            return request.not_found()
-
-        # 從設定讀取
-        config = request.env['ir.config_parameter'].sudo()
-        price_per_point = int(config.get_param('discord.point_price', 10))
-        total_amount = points * price_per_point
-
-        # 建立訂單
-        order = request.env['discord.points.order'].create_order(
-            discord_id=discord_id,
-            points=points,
-            amount=total_amount,
-            payment_method='opay'
-        )
-
-        if not order:
+        token = self._verify_payment_token(t)
+        if token is None:
             return request.render('discord.payment_error', {
-                'error_message': '建立訂單失敗，請確認帳號已綁定',
+                'error_message': '付款連結無效或已過期，請重新使用 !buy 產生付款連結',
             })
 
-        # 取得暫存的付款連結訊息資訊並存入訂單
-        self._attach_payment_message_to_order(order, discord_id)
-
-        # 取得歐富寶 SDK
+        # 取得歐富寶 SDK（先於建立訂單，設定錯誤時不消耗付款連結）
         try:
             sdk = request.env['res.config.settings'].get_opay_sdk()
         except Exception as e:
@@ -222,33 +187,16 @@ class DiscordPayment(http.Controller):
                 'error_message': str(e),
             })
 
-        action_url = f"{sdk.base_url}/Cashier/AioCheckOut/V5"
-        base_url = config.get_param('web.base.url')
-
-        order_params = {
-            'MerchantTradeNo': order.name,
-            'MerchantTradeDate': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
-            'TotalAmount': total_amount,
-            'TradeDesc': 'Discord點數購買',
-            'ItemName': f'Discord 點數 {points} 點',
-            'ReturnURL': f'{base_url}/discord/pay/opay/callback',
-            'ChoosePayment': 'ALL',
-            'ClientBackURL': f'{base_url}/discord/pay/result?order={order.name}',
-            'OrderResultURL': f'{base_url}/discord/pay/result?order={order.name}',
-            'NeedExtraPaidInfo': 'N',
-            'EncryptType': 1,
-        }
-
-        try:
-            opay_params = sdk.create_order(order_params)
-        except Exception as e:
-            _logger.error(f"歐富寶訂單建立失敗: {e}")
+        order, opay_params, error_message = self._create_order_from_token(
+            token, 'opay', '歐富寶', sdk
+        )
+        if not order:
             return request.render('discord.payment_error', {
-                'error_message': f'訂單建立失敗: {e}',
+                'error_message': error_message,
             })
 
         return request.render('discord.opay_form', {
-            'action_url': action_url,
+            'action_url': f"{sdk.base_url}/Cashier/AioCheckOut/V5",
             'params': opay_params,
         })
 
@@ -256,36 +204,7 @@ class DiscordPayment(http.Controller):
                 methods=['POST'], csrf=False)
     def opay_callback(self, **kwargs):
         """歐富寶付款回調 (Server to Server)"""
-        _logger.info(f"歐富寶回調: {kwargs}")
-
-        # 驗證 CheckMacValue
-        try:
-            sdk = request.env['res.config.settings'].get_opay_sdk()
-        except Exception as e:
-            _logger.error(f"取得歐富寶 SDK 失敗: {e}")
-            return '0|SDK Error'
-
-        check_mac = sdk.generate_check_value(kwargs)
-        if check_mac != kwargs.get('CheckMacValue'):
-            _logger.warning("歐富寶回調驗證失敗")
-            return '0|CheckMacValue Error'
-
-        # 檢查付款狀態
-        rtn_code = kwargs.get('RtnCode')
-        merchant_trade_no = kwargs.get('MerchantTradeNo')
-        trade_no = kwargs.get('TradeNo')
-
-        if rtn_code == '1':
-            # 付款成功
-            order = request.env['discord.points.order'].sudo().search([
-                ('name', '=', merchant_trade_no)
-            ], limit=1)
-
-            if order and order.state == 'pending':
-                order.mark_as_paid(trade_no)
-                _logger.info(f"訂單 {merchant_trade_no} 付款成功，加點 {order.points}")
-
-        return '1|OK'
+        return self._handle_payment_callback('opay', '歐富寶', kwargs)
 
     @http.route('/discord/pay/result', auth='public', type='http',
                 methods=['GET', 'POST'], csrf=False)
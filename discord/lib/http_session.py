@@ -0,0 +1,49 @@
+# coding: utf-8
+"""
+金流 SDK 共用的 HTTP 連線
+
+所有 Server to Server 呼叫共用同一個 requests.Session，保持連線並重用 TLS，
+避免每次查詢訂單都重新建立 TCP/TLS 連線。
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (連線逾時, 讀取逾時) 秒
+DEFAULT_TIMEOUT = (5, 20)
+
+# 每個金流主機保留的連線數
+POOL_MAXSIZE = 10
+
+# 只重試連線失敗（請求尚未送出），避免重複執行退刷等非冪等操作
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=0,
+    status=0,
+    other=0,
+    backoff_factor=0.5,
+)
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """取得共用 Session（thread-safe，首次呼叫時建立）"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def post(url, data, timeout=DEFAULT_TIMEOUT):
+    return get_session().post(url, data=data, timeout=timeout)
@@ -1,12 +1,12 @@
 # coding: utf-8
-import collections
 import hashlib
-import copy
-import requests
+import hmac
 import json
 from decimal import Decimal
 from urllib.parse import quote_plus, parse_qsl
 
+from . import http_session
+
 """
 歐富寶 O'Pay 支付 SDK
 參考綠界 ECPay SDK 架構，適配歐富寶 API
@@ -154,30 +154,44 @@ class BasePayment(object):
                     if parameters.get(k) < 0:
                         del parameters[k]
 
-    def generate_check_value(self, params):
-        _params = copy.deepcopy(params)
-
-        if _params.get('CheckMacValue'):
-            _params.pop('CheckMacValue')
-
-        encrypt_type = int(_params.get('EncryptType', 1))
-
-        _params.update({'MerchantID': self.MerchantID})
+    # CheckMacValue 編碼時不轉換的字元
+    _MAC_SAFE_CHARACTERS = '-_.!*()'
 
-        ordered_params = collections.OrderedDict(
-            sorted(_params.items(), key=lambda k: k[0].lower()))
-
-        encoding_lst = []
-        encoding_lst.append('HashKey=%s&' % self.HashKey)
-        encoding_lst.append(''.join(
-            ['{}={}&'.format(key, value) for key, value in ordered_params.items()]))
-        encoding_lst.append('HashIV=%s' % self.HashIV)
+    def _mac_affixes(self):
+        """
+        HashKey 前綴與 HashIV 後綴（已編碼），每個 SDK 實例只計算一次
 
-        safe_characters = '-_.!*()'
+        quote_plus 與 lower 都是逐字元轉換，可分段編碼後再串接。
+        """
+        key = (self.HashKey, self.HashIV)
+        cached = getattr(self, '_mac_affix_cache', None)
+        if cached is None or cached[0] != key:
+            prefix = quote_plus('HashKey=%s&' % self.HashKey, safe=self._MAC_SAFE_CHARACTERS).lower()
+            suffix = quote_plus('HashIV=%s' % self.HashIV, safe=self._MAC_SAFE_CHARACTERS).lower()
+            cached = (key, prefix, suffix)
+            self._mac_affix_cache = cached
+        return cached[1], cached[2]
 
-        encoding_str = ''.join(encoding_lst)
-        encoding_str = quote_plus(
-            str(encoding_str), safe=safe_characters).lower()
+    def generate_check_value(self, params):
+        # 不複製參數：排序時略過 CheckMacValue 並以 MerchantID 取代原值
+        skip_mac = bool(params.get('CheckMacValue'))
+        items = [
+            (key, self.MerchantID if key == 'MerchantID' else value)
+            for key, value in params.items()
+            if not (skip_mac and key == 'CheckMacValue')
+        ]
+        if 'MerchantID' not in params:
+            items.append(('MerchantID', self.MerchantID))
+        items.sort(key=lambda item: item[0].lower())
+
+        encrypt_type = int(params.get('EncryptType', 1))
+
+        prefix, suffix = self._mac_affixes()
+        body = quote_plus(
+            ''.join([f'{key}={value}&' for key, value in items]),
+            safe=self._MAC_SAFE_CHARACTERS,
+        ).lower()
+        encoding_str = prefix + body + suffix
 
         check_mac_value = ''
         if encrypt_type == 1:
@@ -189,6 +203,14 @@ class BasePayment(object):
 
         return check_mac_value
 
+    def verify_check_value(self, params):
+        """以固定時間比對回調的 CheckMacValue"""
+        received = params.get('CheckMacValue')
+        if not received:
+            return False
+        expected = self.generate_check_value(params)
+        return hmac.compare_digest(expected.encode('utf-8'), str(received).encode('utf-8'))
+
     def integrate_parameter(self, parameters, patterns):
         parameters['MerchantID'] = self.MerchantID
         self.check_required_parameter(parameters, patterns)
@@ -196,8 +218,8 @@ class BasePayment(object):
         parameters['CheckMacValue'] = self.generate_check_value(parameters)
         return parameters
 
-    def send_post(self, url, params):
-        response = requests.post(url, data=params)
+    def send_post(self, url, params, timeout=http_session.DEFAULT_TIMEOUT):
+        response = http_session.post(url, params, timeout=timeout)
         return response
 
 
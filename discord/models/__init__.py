@@ -1,11 +1,18 @@
 from . import res_config
 from . import res_partner
 from . import res_users
+from . import ir_config_parameter
 from . import discord_bot_manager
+from . import discord_bot_leader
 from . import discord_channel
 from . import discord_command
 from . import channel_autodelete
 from . import points_order
 from . import points_gift
+from . import points_ledger
+from . import payment_callback
+from . import payment_link
 from . import message_template
+from . import dm_outbox
+from . import announce_job
 
@@ -0,0 +1,138 @@
+import logging
+
+from odoo import fields, models, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class DiscordAnnounceJob(models.Model):
+    """
+    群發通知任務
+
+    渲染後的訊息只儲存一次，接收者依 ID 排序後以 cursor 記錄發送進度，
+    Bot 每發送一批就寫回 cursor，重啟後從 cursor 繼續，最多重送一批。
+    """
+    _name = 'discord.announce.job'
+    _description = 'Discord 群發通知任務'
+    _order = 'id desc'
+
+    name = fields.Char('名稱', required=True, readonly=True)
+    guild_id = fields.Char('伺服器 ID', readonly=True)
+    role_id = fields.Char('身分組 ID', readonly=True)
+    role_name = fields.Char('身分組', readonly=True)
+    author_discord_id = fields.Char('發送者 Discord ID', readonly=True)
+    payload = fields.Json('訊息內容', required=True, readonly=True,
+                          help='send() 的參數，Embed 以 dict 儲存')
+    recipient_ids = fields.Json('接收者', required=True, readonly=True,
+                                help='依 Discord ID 排序的接收者列表')
+    state = fields.Selection([
+        ('running', '發送中'),
+        ('paused', '已暫停'),
+        ('cancelled', '已取消'),
+        ('done', '已完成'),
+    ], string='狀態', default='running', required=True, index=True, readonly=True)
+    cursor = fields.Integer('進度', default=0, readonly=True,
+                            help='recipient_ids 中已處理的數量')
+    total = fields.Integer('總人數', readonly=True)
+    sent_count = fields.Integer('成功', default=0, readonly=True)
+    failed_count = fields.Integer('失敗', default=0, readonly=True)
+    elapsed_seconds = fields.Float('發送耗時（秒）', default=0.0, readonly=True,
+                                   help='實際發送的累計時間，不含暫停期間')
+    last_checkpoint_at = fields.Datetime('最後進度時間', readonly=True)
+    finished_at = fields.Datetime('完成時間', readonly=True)
+    progress_channel_id = fields.Char('進度訊息頻道 ID', readonly=True)
+    progress_message_id = fields.Char('進度訊息 ID', readonly=True)
+
+    progress = fields.Float('完成率', compute='_compute_stats')
+    remaining = fields.Integer('剩餘人數', compute='_compute_stats')
+    throughput = fields.Float('每秒發送數', compute='_compute_stats', digits=(16, 2))
+    eta_seconds = fields.Integer('預估剩餘秒數', compute='_compute_stats')
+
+    @api.depends('cursor', 'total', 'elapsed_seconds')
+    def _compute_stats(self):
+        for job in self:
+            job.remaining = max(job.total - job.cursor, 0)
+            job.progress = (job.cursor * 100.0 / job.total) if job.total else 100.0
+            job.throughput = (job.cursor / job.elapsed_seconds) if job.elapsed_seconds else 0.0
+            job.eta_seconds = round(job.remaining / job.throughput) if job.throughput else 0
+
+    @api.model
+    def create_job(self, name: str, send_kwargs: dict, recipient_ids: list,
+                   guild_id=None, role_id=None, role_name=None, author_discord_id=None):
+        """
+        建立群發任務
+
+        :param send_kwargs: render_message_by_type 的回傳值
+        :param recipient_ids: 接收者 Discord ID 列表
+        :return: 任務記錄
+        """
+        from ..services.message_payload import dump_send_kwargs
+
+        recipients = sorted({int(r) for r in recipient_ids})
+        return self.sudo().create({
+            'name': name,
+            'guild_id': guild_id and str(guild_id),
+            'role_id': role_id and str(role_id),
+            'role_name': role_name,
+            'author_discord_id': author_discord_id and str(author_discord_id),
+            'payload': dump_send_kwargs(send_kwargs),
+            'recipient_ids': recipients,
+            'total': len(recipients),
+        })
+
+    @api.model
+    def _checkpoint(self, job_id: int, cursor: int, sent: int, failed: int, elapsed: float) -> str:
+        """
+        寫回一批的發送結果
+
+        發送中、已暫停、已取消的任務都會記錄進度，避免批次進行中被暫停或取消時遺失該批結果、
+        繼續後重送；只有發送中的任務會轉為完成。回傳目前狀態供 Bot 判斷是否繼續。
+        """
+        self.env.cr.execute("""
+            UPDATE discord_announce_job
+               SET cursor = %s,
+                   sent_count = sent_count + %s,
+                   failed_count = failed_count + %s,
+                   elapsed_seconds = elapsed_seconds + %s,
+                   last_checkpoint_at = now() at time zone 'UTC',
+                   state = CASE WHEN state = 'running' AND %s >= total THEN 'done' ELSE state END,
+                   finished_at = CASE WHEN state = 'running' AND %s >= total
+                                      THEN now() at time zone 'UTC' ELSE finished_at END
+             WHERE id = %s
+               AND state IN ('running', 'paused', 'cancelled')
+               AND cursor < %s
+        """, [cursor, sent, failed, elapsed, cursor, cursor, job_id, cursor])
+        self.env.cr.execute("SELECT state FROM discord_announce_job WHERE id = %s", [job_id])
+        row = self.env.cr.fetchone()
+        self.invalidate_model()
+        return row[0] if row else 'cancelled'
+
+    @api.model
+    def _running_job_ids(self) -> list:
+        return self.sudo().search([('state', '=', 'running')], order='id').ids
+
+    def _notify_bot(self):
+        from ..services.pg_notify import notify_bot
+        notify_bot(self.env.cr, 'announce_job')
+
+    def action_pause(self):
+        """暫停發送，目前這一批完成後停止"""
+        if any(job.state != 'running' for job in self):
+            raise UserError('只能暫停發送中的任務')
+        self.write({'state': 'paused'})
+        self._notify_bot()
+
+    def action_resume(self):
+        """從上次進度繼續發送"""
+        if any(job.state != 'paused' for job in self):
+            raise UserError('只能繼續已暫停的任務')
+        self.write({'state': 'running'})
+        self._notify_bot()
+
+    def action_cancel(self):
+        """取消發送"""
+        if any(job.state not in ('running', 'paused') for job in self):
+            raise UserError('只能取消發送中或已暫停的任務')
+        self.write({'state': 'cancelled', 'finished_at': fields.Datetime.now()})
+        self._notify_bot()
@@ -32,10 +32,9 @@ class DiscordChannelAutodelete(models.Model):
         }
 
     def _notify_bot_cache_clear(self):
-        """通知 Bot 清除自動刪除快取"""
-        from ..services.discord_bot import discord_bot_service
-        if discord_bot_service.is_running:
-            discord_bot_service.clear_autodelete_cache()
+        """通知所有 Odoo 行程中的 Bot 重新載入設定快照（自動刪除設定已變更）"""
+        from ..services.pg_notify import notify_bot
+        notify_bot(self.env.cr, 'config')
 
     @api.model_create_multi
     def create(self, vals_list):
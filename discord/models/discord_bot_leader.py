@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from odoo import fields, models, api
+
+
+class DiscordBotLeader(models.Model):
+    """Discord Bot leader 心跳紀錄，由 LeaderElector 以 SQL 直接寫入"""
+    _name = 'discord.bot.leader'
+    _description = 'Discord Bot Leader'
+
+    name = fields.Char('名稱', required=True, readonly=True)
+    pid = fields.Integer('PID', readonly=True)
+    hostname = fields.Char('主機', readonly=True)
+    elected_at = fields.Datetime('當選時間', readonly=True)
+    heartbeat = fields.Datetime('最後心跳', readonly=True)
+
+    _sql_constraints = [
+        ('name_unique', 'UNIQUE(name)', 'Leader 紀錄不能重複！'),
+    ]
+
+    @api.model
+    def get_leader_info(self) -> dict | None:
+        """取得目前 leader 資訊，心跳逾時則 alive 為 False"""
+        from ..services.leader_election import HEARTBEAT_INTERVAL
+        leader = self.sudo().search([('name', '=', 'discord_bot')], limit=1)
+        if not leader:
+            return None
+        timeout = timedelta(seconds=HEARTBEAT_INTERVAL * 3)
+        return {
+            'pid': leader.pid,
+            'hostname': leader.hostname,
+            'elected_at': leader.elected_at,
+            'heartbeat': leader.heartbeat,
+            'alive': bool(leader.heartbeat) and fields.Datetime.now() - leader.heartbeat < timeout,
+        }
@@ -28,7 +28,7 @@ class DiscordBotManager(models.AbstractModel):
             return False
 
         db_name = self.env.cr.dbname
-        discord_bot_service.start(db_name, token)
+        discord_bot_service.start(db_name)
         return True
 
     @api.model
@@ -40,9 +40,19 @@ class DiscordBotManager(models.AbstractModel):
 
     @api.model
     def restart_bot(self):
-        """重啟 Discord Bot（可從 Odoo 介面呼叫）"""
-        self._stop_bot()
-        return self._start_bot()
+        """
+        重啟 Discord Bot（可從 Odoo 介面呼叫）
+
+        Bot 可能運行在其他 worker，透過 NOTIFY 通知 leader 重新讀取 Token 並重連；
+        若本行程尚未參與 leader election 則一併啟動。
+        """
+        from ..services.discord_bot import discord_bot_service
+        from ..services.pg_notify import notify_bot
+
+        notify_bot(self.env.cr, 'restart')
+        if not discord_bot_service.is_started:
+            return self._start_bot()
+        return True
 
     @api.model
     def get_bot_status(self):
@@ -50,4 +60,9 @@ class DiscordBotManager(models.AbstractModel):
         from ..services.discord_bot import discord_bot_service
         return {
             'running': discord_bot_service.is_running,
+            'is_leader': discord_bot_service.is_leader,
+            'leader': self.env['discord.bot.leader'].get_leader_info(),
+            'odoo_executor': discord_bot_service.get_executor_stats(),
+            'dm_queue': discord_bot_service.get_dm_queue_stats(),
+            'user_resolver': discord_bot_service.get_user_resolver_stats(),
         }
@@ -79,13 +79,9 @@ class DiscordCommandConfig(models.Model):
         return {r.command_name: r.command_type for r in records}
 
     def _notify_bot_cache_clear(self):
-        """通知 Discord Bot 清除指令快取"""
-        try:
-            from ..services.discord_bot import discord_bot_service
-            discord_bot_service.clear_command_cache()
-            _logger.info("已通知 Discord Bot 清除指令快取")
-        except Exception as e:
-            _logger.warning(f"通知 Bot 清除快取失敗: {e}")
+        """通知所有 Odoo 行程中的 Discord Bot 重新載入設定快照（指令設定已變更）"""
+        from ..services.pg_notify import notify_bot
+        notify_bot(self.env.cr, 'config')
 
     @api.model_create_multi
     def create(self, vals_list):
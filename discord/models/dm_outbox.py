@@ -0,0 +1,169 @@
+import logging
+from datetime import timedelta
+
+from odoo import fields, models, api
+
+_logger = logging.getLogger(__name__)
+
+# 失敗後最多重試次數
+MAX_ATTEMPTS = 5
+
+# 重試間隔基數（秒），第 n 次失敗後等待 RETRY_BACKOFF * 2^(n-1) 秒
+RETRY_BACKOFF = 30
+
+# 已發送紀錄保留天數
+KEEP_SENT_DAYS = 7
+
+
+class DiscordDMOutbox(models.Model):
+    """
+    Discord 私訊寄件匣
+
+    Odoo 端只需新增一筆紀錄，由 Bot（leader）以 FOR UPDATE SKIP LOCKED 批次取出發送，
+    Bot 重啟或換手後未完成的私訊會繼續發送。
+    """
+    _name = 'discord.dm.outbox'
+    _description = 'Discord 私訊寄件匣'
+    _order = 'id desc'
+
+    discord_id = fields.Char('Discord ID', required=True, index=True, readonly=True)
+    payload = fields.Json('訊息內容', required=True, readonly=True,
+                          help='send() 的參數，Embed 以 dict 儲存')
+    priority = fields.Integer('優先度', default=0, readonly=True, help='數值越小越優先')
+    state = fields.Selection([
+        ('pending', '待發送'),
+        ('sending', '發送中'),
+        ('sent', '已發送'),
+        ('failed', '發送失敗'),
+    ], string='狀態', default='pending', required=True, index=True, readonly=True)
+    attempts = fields.Integer('嘗試次數', default=0, readonly=True)
+    next_retry_at = fields.Datetime('下次嘗試時間', default=fields.Datetime.now, index=True, readonly=True,
+                                    help='待發送：最早可發送時間；發送中：租約到期時間')
+    last_error = fields.Text('最後錯誤', readonly=True)
+    sent_at = fields.Datetime('發送時間', readonly=True)
+    delete_message_id = fields.Char('發送後刪除訊息 ID', readonly=True,
+                                    help='發送成功後要刪除的訊息，例如付款連結')
+    delete_channel_id = fields.Char('發送後刪除頻道 ID', readonly=True)
+
+    @api.model
+    def enqueue(self, discord_id: str, send_kwargs: dict, priority: int = 0,
+                delete_message_id: str = None, delete_channel_id: str = None):
+        """
+        新增一筆待發送私訊，並通知 Bot 立即處理
+
+        可從任何 Odoo 行程呼叫；交易提交後 Bot 才會收到通知並看到紀錄。
+
+        :param discord_id: Discord 用戶 ID
+        :param send_kwargs: render_message_by_type 的回傳值
+        :param priority: 優先度（DMPriority）
+        :param delete_message_id: 發送成功後要刪除的訊息 ID
+        :param delete_channel_id: 該訊息所在頻道 ID
+        """
+        from ..services.message_payload import dump_send_kwargs
+
+        record = self.sudo().create({
+            'discord_id': str(discord_id),
+            'payload': dump_send_kwargs(send_kwargs),
+            'priority': int(priority),
+            'delete_message_id': delete_message_id or False,
+            'delete_channel_id': delete_channel_id or False,
+        })
+
+        from ..services.pg_notify import notify_bot
+        notify_bot(self.env.cr, 'dm_outbox')
+        return record
+
+    @api.model
+    def _claim_batch(self, limit: int, lease_seconds: int) -> list[dict]:
+        """
+        取出一批可發送的私訊並標記為發送中
+
+        租約到期仍為發送中的紀錄（Bot 發送途中結束）會被重新取出。
+
+        :return: [{'id', 'discord_id', 'payload', 'priority', 'delete_message_id', 'delete_channel_id'}]
+        """
+        self.env.cr.execute("""
+            UPDATE discord_dm_outbox o
+               SET state = 'sending',
+                   next_retry_at = now() at time zone 'UTC' + make_interval(secs => %s)
+              FROM (
+                    SELECT id
+                      FROM discord_dm_outbox
+                     WHERE state IN ('pending', 'sending')
+                       AND next_retry_at <= now() at time zone 'UTC'
+                     ORDER BY priority, id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   ) c
+             WHERE o.id = c.id
+         RETURNING o.id, o.discord_id, o.payload, o.priority,
+                   o.delete_message_id, o.delete_channel_id
+        """, [lease_seconds, limit])
+        columns = ('id', 'discord_id', 'payload', 'priority', 'delete_message_id', 'delete_channel_id')
+        rows = [dict(zip(columns, row)) for row in self.env.cr.fetchall()]
+        rows.sort(key=lambda r: (r['priority'], r['id']))
+        return rows
+
+    @api.model
+    def _renew_lease(self, ids: list, lease_seconds: int):
+        """延長仍在 Bot 佇列中或發送中的紀錄的租約，避免逾時被重新取出而重複發送"""
+        if not ids:
+            return
+        self.env.cr.execute("""
+            UPDATE discord_dm_outbox
+               SET next_retry_at = now() at time zone 'UTC' + make_interval(secs => %s)
+             WHERE id IN %s AND state = 'sending'
+        """, [lease_seconds, tuple(ids)])
+        self.invalidate_model(['next_retry_at'])
+
+    @api.model
+    def _record_results(self, sent_ids: list, failures: list):
+        """
+        批次寫回發送結果
+
+        :param sent_ids: 發送成功的 id
+        :param failures: [(id, error, permanent)]，permanent 表示不需重試（例如用戶關閉私訊）
+        """
+        if sent_ids:
+            self.env.cr.execute("""
+                UPDATE discord_dm_outbox
+                   SET state = 'sent',
+                       attempts = attempts + 1,
+                       sent_at = now() at time zone 'UTC',
+                       last_error = NULL
+                 WHERE id IN %s
+            """, [tuple(sent_ids)])
+
+        if failures:
+            ids, errors, permanents = zip(*failures)
+            self.env.cr.execute("""
+                UPDATE discord_dm_outbox o
+                   SET attempts = o.attempts + 1,
+                       last_error = f.error,
+                       state = CASE WHEN f.permanent OR o.attempts + 1 >= %s
+                                    THEN 'failed' ELSE 'pending' END,
+                       next_retry_at = now() at time zone 'UTC'
+                                       + make_interval(secs => %s * power(2, o.attempts))
+                  FROM unnest(%s::int[], %s::text[], %s::bool[]) AS f(id, error, permanent)
+                 WHERE o.id = f.id
+            """, [MAX_ATTEMPTS, RETRY_BACKOFF, list(ids), list(errors), list(permanents)])
+
+        self.invalidate_model()
+
+    def action_retry(self):
+        """將發送失敗的私訊重新排入寄件匣"""
+        records = self.filtered(lambda r: r.state == 'failed')
+        records.write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_retry_at': fields.Datetime.now(),
+        })
+        if records:
+            from ..services.pg_notify import notify_bot
+            notify_bot(self.env.cr, 'dm_outbox')
+
+    @api.autovacuum
+    def _gc_sent(self):
+        """清除過期的已發送紀錄"""
+        limit = fields.Datetime.now() - timedelta(days=KEEP_SENT_DAYS)
+        self.search([('state', '=', 'sent'), ('sent_at', '<', limit)]).unlink()
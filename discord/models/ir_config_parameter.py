@@ -0,0 +1,36 @@
+from odoo import api, models
+
+from ..services.config_snapshot import SNAPSHOT_PARAMS
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    def _notify_bot_if_snapshot_param(self, keys):
+        """
+        Bot 設定快照中的參數異動時通知 Bot 重新載入
+
+        web.base.url 會在管理員登入時更新，部分流程也會直接寫入系統參數，
+        不經過設定頁面的 set_values。
+        """
+        if set(keys) & set(SNAPSHOT_PARAMS):
+            from ..services.pg_notify import notify_bot
+            notify_bot(self.env.cr, 'config')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._notify_bot_if_snapshot_param(records.mapped('key'))
+        return records
+
+    def write(self, vals):
+        keys = self.mapped('key')
+        result = super().write(vals)
+        self._notify_bot_if_snapshot_param(keys + self.mapped('key'))
+        return result
+
+    def unlink(self):
+        keys = self.mapped('key')
+        result = super().unlink()
+        self._notify_bot_if_snapshot_param(keys)
+        return result
@@ -1,13 +1,105 @@
 import logging
 import random
-from jinja2 import Template
+import threading
+import time
+from collections import OrderedDict
+from itertools import accumulate
 
-import discord as discord_lib
+from jinja2 import Environment
 
 from odoo import fields, models, api
 
+from ..services.template_index import build_message, parse_color
+
 _logger = logging.getLogger(__name__)
 
+# 編譯後模板的快取上限（每個模板最多 5 個欄位）
+TEMPLATE_CACHE_SIZE = 512
+
+# 模板候選索引的有效時間（秒），其他 Odoo 行程最晚在此時間後看到模板異動
+VARIANT_INDEX_TTL = 60
+
+
+class CompiledTemplateCache:
+    """
+    編譯後 Jinja2 模板的 LRU 快取（thread-safe）
+
+    key 為 (record id, 欄位, write_date)，模板修改後 write_date 改變即不會命中舊版本，
+    其他 Odoo 行程中的舊項目會自然被淘汰。
+    """
+
+    def __init__(self, maxsize: int = TEMPLATE_CACHE_SIZE):
+        self._maxsize = maxsize
+        self._env = Environment()
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, source: str):
+        """取得編譯後的模板，未命中時編譯並放入快取"""
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        # 編譯不持有鎖，同時未命中時可能重複編譯，結果相同
+        template = self._env.from_string(source)
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self._maxsize:
+                self._templates.popitem(last=False)
+        return template
+
+    def invalidate(self, record_ids):
+        """移除指定模板的所有快取項目"""
+        record_ids = set(record_ids)
+        with self._lock:
+            for key in [k for k in self._templates if k[0] in record_ids]:
+                del self._templates[key]
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+_template_cache = CompiledTemplateCache()
+
+
+class VariantIndexCache:
+    """
+    各模板類型的候選 id 與累計權重快取（thread-safe）
+
+    key 為 (資料庫, template_type)。模板異動時只清除本快取，不清除整個 registry 的 ormcache；
+    本行程立即生效，其他 Odoo 行程在 VARIANT_INDEX_TTL 秒內過期後重新查詢。
+    """
+
+    def __init__(self, ttl: float = VARIANT_INDEX_TTL):
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """取得未過期的 (ids, cum_weights)，未命中時回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: tuple, value: tuple):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+
+    def invalidate(self, dbname: str):
+        """移除指定資料庫的所有項目"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dbname]:
+                del self._entries[key]
+
+
+_variant_index_cache = VariantIndexCache()
+
 
 class DiscordMessageTemplate(models.Model):
     _name = 'discord.message.template'
@@ -31,6 +123,12 @@ class DiscordMessageTemplate(models.Model):
     embed_image_url = fields.Char('圖片網址')
     embed_thumbnail_url = fields.Char('縮圖網址')
     embed_footer = fields.Char('頁尾文字')
+    weight = fields.Integer('權重', default=1, required=True,
+                            help='同類型有多個啟用模板時，依權重比例隨機選用')
+
+    _sql_constraints = [
+        ('weight_positive', 'CHECK(weight > 0)', '權重必須大於 0！'),
+    ]
 
     @api.model
     def _get_template_types(self):
@@ -44,16 +142,46 @@ class DiscordMessageTemplate(models.Model):
             ('payment_notification', '付款成功通知'),
             ('points_query', '點數查詢'),
             ('announce', '群發通知'),
+            ('announce_progress', '群發進度通知'),
             ('announce_result', '群發結果通知'),
         ]
 
-    def _render_jinja(self, template_str: str, values: dict) -> str:
-        """渲染單一 Jinja2 字串"""
+    def _notify_bot_cache_clear(self):
+        """清除模板候選索引，並通知所有 Odoo 行程中的 Discord Bot 重新載入設定快照"""
+        _variant_index_cache.invalidate(self.env.cr.dbname)
+        from ..services.pg_notify import notify_bot
+        notify_bot(self.env.cr, 'config')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """新增時通知 Bot"""
+        records = super().create(vals_list)
+        self._notify_bot_cache_clear()
+        return records
+
+    def write(self, vals):
+        """修改時清除編譯快取並通知 Bot"""
+        _template_cache.invalidate(self.ids)
+        result = super().write(vals)
+        self._notify_bot_cache_clear()
+        return result
+
+    def unlink(self):
+        """刪除時清除編譯快取並通知 Bot"""
+        _template_cache.invalidate(self.ids)
+        result = super().unlink()
+        self._notify_bot_cache_clear()
+        return result
+
+    def _render_field(self, field_name: str, values: dict) -> str:
+        """渲染單一欄位，使用快取中編譯後的模板"""
+        source = self[field_name]
         try:
-            return Template(template_str).render(**values)
+            template = _template_cache.get((self.id, field_name, self.write_date), source)
+            return template.render(**values)
         except Exception as e:
             _logger.error(f"Jinja2 渲染失敗: {e}")
-            return template_str
+            return source
 
     def render(self, values: dict) -> str:
         """
@@ -63,7 +191,7 @@ class DiscordMessageTemplate(models.Model):
         :return: 渲染後的字串
         """
         self.ensure_one()
-        return self._render_jinja(self.body, values)
+        return self._render_field('body', values)
 
     def render_message(self, values: dict) -> dict:
         """
@@ -73,49 +201,51 @@ class DiscordMessageTemplate(models.Model):
         :return: {'content': ...} 或 {'embed': discord.Embed(...)}
         """
         self.ensure_one()
-        rendered_body = self._render_jinja(self.body, values)
-
-        if not self.use_embed:
-            return {'content': rendered_body}
-
-        # 解析顏色
-        color = None
-        if self.embed_color:
-            hex_str = self.embed_color.strip().lstrip('#')
-            try:
-                color = discord_lib.Colour(int(hex_str, 16))
-            except ValueError:
-                _logger.warning(f"無效的 Embed 顏色: {self.embed_color}")
-
-        embed = discord_lib.Embed(
-            description=rendered_body,
-            color=color,
+        return build_message(
+            self.use_embed,
+            self._render_field('body', values),
+            color=parse_color(self.embed_color),
+            title=self.embed_title and self._render_field('embed_title', values),
+            image_url=self.embed_image_url and self._render_field('embed_image_url', values),
+            thumbnail_url=self.embed_thumbnail_url and self._render_field('embed_thumbnail_url', values),
+            footer=self.embed_footer and self._render_field('embed_footer', values),
         )
 
-        if self.embed_title:
-            embed.title = self._render_jinja(self.embed_title, values)
-
-        if self.embed_image_url:
-            embed.set_image(url=self._render_jinja(self.embed_image_url, values))
-
-        if self.embed_thumbnail_url:
-            embed.set_thumbnail(url=self._render_jinja(self.embed_thumbnail_url, values))
-
-        if self.embed_footer:
-            embed.set_footer(text=self._render_jinja(self.embed_footer, values))
+    @api.model
+    def _get_variant_index(self, template_type: str) -> tuple:
+        """
+        取得該類型啟用模板的 id 與累計權重（快取於 _variant_index_cache，模板異動時清除）
 
-        return {'embed': embed}
+        :return: (ids, cum_weights)
+        """
+        key = (self.env.cr.dbname, template_type)
+        index = _variant_index_cache.get(key)
+        if index is None:
+            templates = self.sudo().search([
+                ('template_type', '=', template_type),
+                ('active', '=', True),
+            ], order='id')
+            index = (tuple(templates.ids), tuple(accumulate(templates.mapped('weight'))))
+            _variant_index_cache.set(key, index)
+        return index
 
     @api.model
     def get_template(self, template_type: str):
-        """根據類型取得模板，若有多個啟用模板則隨機選擇一個"""
-        templates = self.sudo().search([
-            ('template_type', '=', template_type),
-            ('active', '=', True),
-        ])
-        if not templates:
-            return self.browse()
-        return random.choice(templates)
+        """
+        根據類型取得模板，若有多個啟用模板則依權重隨機選擇一個
+
+        候選索引可能是其他 Odoo 行程異動前的內容，選中的模板已刪除、封存或改為其他類型時，
+        清除本行程的索引並重新查詢一次。
+        """
+        for _attempt in range(2):
+            ids, cum_weights = self._get_variant_index(template_type)
+            if not ids:
+                return self.browse()
+            template = self.sudo().browse(random.choices(ids, cum_weights=cum_weights)[0]).exists()
+            if template and template.active and template.template_type == template_type:
+                return template
+            _variant_index_cache.invalidate(self.env.cr.dbname)
+        return self.browse()
 
     @api.model
     def render_by_type(self, template_type: str, values: dict) -> str | None:
@@ -0,0 +1,208 @@
+import json
+import logging
+import time
+
+from odoo import fields, models, api
+from odoo.tools.sql import table_exists
+
+_logger = logging.getLogger(__name__)
+
+# 每批處理的回調數量
+BATCH_SIZE = 100
+
+# 處理失敗後最多重試次數
+MAX_ATTEMPTS = 5
+
+
+class DiscordPaymentCallback(models.Model):
+    """
+    金流回調收件匣
+
+    回調驗證簽名後只寫入一筆紀錄即回覆 1|OK，不佔用 HTTP worker；
+    由 cron「Discord: 付款入帳」以 FOR UPDATE SKIP LOCKED 批次入帳。
+    同一筆回調重送時以唯一索引忽略，不重複寫入。
+    """
+    _name = 'discord.payment.callback'
+    _description = 'Discord 金流回調'
+    _order = 'id desc'
+
+    payment_method = fields.Selection([
+        ('ecpay', '綠界'),
+        ('opay', '歐富寶'),
+    ], string='付款方式', required=True, readonly=True)
+    merchant_trade_no = fields.Char('訂單編號', required=True, index=True, readonly=True)
+    # 唯一索引視 NULL 為互不相同，缺少的值一律存為空字串才能去重
+    trade_no = fields.Char('金流交易編號', required=True, default='', readonly=True)
+    rtn_code = fields.Char('回傳代碼', required=True, default='', readonly=True)
+    params = fields.Json('回調參數', readonly=True)
+    state = fields.Selection([
+        ('pending', '待處理'),
+        ('done', '已入帳'),
+        ('ignored', '已忽略'),
+        ('failed', '處理失敗'),
+    ], string='狀態', default='pending', required=True, index=True, readonly=True)
+    attempts = fields.Integer('嘗試次數', default=0, readonly=True)
+    last_error = fields.Text('最後錯誤', readonly=True)
+    processed_at = fields.Datetime('處理時間', readonly=True)
+    lag_seconds = fields.Float('入帳延遲（秒）', readonly=True, digits=(16, 2),
+                               help='收到回調到處理完成的時間')
+
+    _sql_constraints = [
+        ('callback_unique', 'UNIQUE(payment_method, merchant_trade_no, trade_no, rtn_code)',
+         '重複的金流回調！'),
+    ]
+
+    def _auto_init(self):
+        # 舊版允許 NULL：先移除以空字串比對後重複的回調並補上空字串，才能加上 NOT NULL
+        cr = self.env.cr
+        if table_exists(cr, self._table):
+            cr.execute("""
+                DELETE FROM discord_payment_callback c
+                 USING discord_payment_callback k
+                 WHERE c.id > k.id
+                   AND c.payment_method = k.payment_method
+                   AND c.merchant_trade_no = k.merchant_trade_no
+                   AND COALESCE(c.trade_no, '') = COALESCE(k.trade_no, '')
+                   AND COALESCE(c.rtn_code, '') = COALESCE(k.rtn_code, '')
+            """)
+            cr.execute("""
+                UPDATE discord_payment_callback
+                   SET trade_no = COALESCE(trade_no, ''),
+                       rtn_code = COALESCE(rtn_code, '')
+                 WHERE trade_no IS NULL OR rtn_code IS NULL
+            """)
+        return super()._auto_init()
+
+    @api.model
+    def receive(self, payment_method: str, params: dict) -> bool:
+        """
+        寫入已驗證簽名的回調，並觸發入帳 cron
+
+        :return: 是否為新的回調（False 表示重送）
+        """
+        self.env.cr.execute("""
+            INSERT INTO discord_payment_callback
+                   (payment_method, merchant_trade_no, trade_no, rtn_code, params, state, attempts,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, %s, %s, 'pending', 0,
+                    %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (payment_method, merchant_trade_no, trade_no, rtn_code) DO NOTHING
+         RETURNING id
+        """, [
+            payment_method,
+            params.get('MerchantTradeNo') or '',
+            params.get('TradeNo') or '',
+            params.get('RtnCode') or '',
+            json.dumps(params),
+            self.env.uid, self.env.uid,
+        ])
+        if self.env.cr.fetchone() is None:
+            return False
+        self.env.ref('discord.ir_cron_payment_settle').sudo()._trigger()
+        return True
+
+    @api.model
+    def _claim_batch(self, after_id: int, limit: int) -> list:
+        """取出一批待處理回調，其他 worker 已取出的會略過"""
+        self.env.cr.execute("""
+            SELECT id
+              FROM discord_payment_callback
+             WHERE state = 'pending' AND id > %s
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [after_id, limit])
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _settle(self):
+        """入帳單筆回調，失敗時回滾該筆並留待重試"""
+        self.ensure_one()
+        Order = self.env['discord.points.order'].sudo()
+        try:
+            with self.env.cr.savepoint():
+                # 空的交易編號以 NULL 寫入訂單，避免觸發訂單的 (payment_method, trade_no) 唯一限制
+                paid = Order._process_payment_callback(
+                    self.payment_method, self.merchant_trade_no, self.trade_no or None, self.rtn_code,
+                )
+        except Exception as e:
+            self.env.invalidate_all()
+            attempts = self.attempts + 1
+            _logger.error(f"付款回調 {self.id} 入帳失敗（第 {attempts} 次）: {e}")
+            self.write({
+                'attempts': attempts,
+                'last_error': str(e),
+                'state': 'failed' if attempts >= MAX_ATTEMPTS else 'pending',
+            })
+            return False
+
+        now = fields.Datetime.now()
+        self.write({
+            'state': 'done' if paid else 'ignored',
+            'attempts': self.attempts + 1,
+            'last_error': False,
+            'processed_at': now,
+            'lag_seconds': (now - self.create_date).total_seconds(),
+        })
+        return paid
+
+    @api.model
+    def _cron_settle(self, batch_size: int = BATCH_SIZE):
+        """批次入帳待處理的回調，每批提交一次"""
+        started = time.monotonic()
+        processed = 0
+        last_id = 0
+        while True:
+            # 以 last_id 前進，失敗留待重試的回調下次 cron 再處理
+            ids = self._claim_batch(last_id, batch_size)
+            if not ids:
+                break
+            for callback in self.browse(ids):
+                callback._settle()
+            self.env.cr.commit()
+            processed += len(ids)
+            last_id = ids[-1]
+            if len(ids) < batch_size:
+                break
+
+        if processed:
+            elapsed = time.monotonic() - started
+            stats = self._settlement_stats()
+            _logger.info(
+                f"付款回調入帳 {processed} 筆，耗時 {elapsed:.2f} 秒"
+                f"（{processed / elapsed if elapsed else 0:.1f} 筆/秒），"
+                f"待處理 {stats['pending']} 筆，最大延遲 {stats['max_lag']:.1f} 秒"
+            )
+
+    @api.model
+    def _settlement_stats(self) -> dict:
+        """
+        入帳統計
+
+        :return: {'pending', 'oldest_pending_seconds', 'processed_1h', 'avg_lag', 'max_lag'}
+        """
+        self.env.cr.execute("""
+            SELECT count(*) FILTER (WHERE state = 'pending'),
+                   COALESCE(EXTRACT(EPOCH FROM now() at time zone 'UTC'
+                            - min(create_date) FILTER (WHERE state = 'pending')), 0),
+                   count(*) FILTER (WHERE processed_at >= now() at time zone 'UTC' - interval '1 hour'),
+                   COALESCE(avg(lag_seconds) FILTER (WHERE processed_at >= now() at time zone 'UTC' - interval '1 hour'), 0),
+                   COALESCE(max(lag_seconds) FILTER (WHERE processed_at >= now() at time zone 'UTC' - interval '1 hour'), 0)
+              FROM discord_payment_callback
+             WHERE state = 'pending'
+                OR processed_at >= now() at time zone 'UTC' - interval '1 hour'
+        """)
+        pending, oldest, processed, avg_lag, max_lag = self.env.cr.fetchone()
+        return {
+            'pending': pending,
+            'oldest_pending_seconds': float(oldest),
+            'processed_1h': processed,
+            'avg_lag': float(avg_lag),
+            'max_lag': float(max_lag),
+        }
+
+    def action_retry(self):
+        """重新處理失敗的回調"""
+        records = self.filtered(lambda r: r.state == 'failed')
+        records.write({'state': 'pending', 'attempts': 0})
+        if records:
+            self.env.ref('discord.ir_cron_payment_settle').sudo()._trigger()
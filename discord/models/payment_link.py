@@ -0,0 +1,106 @@
+import logging
+
+from odoo import fields, models, api
+
+_logger = logging.getLogger(__name__)
+
+
+class DiscordPaymentLink(models.Model):
+    """
+    付款連結紀錄
+
+    付款連結為簽章 token（見 services/payment_token.py），內含一次性 nonce。
+    Bot 私訊送出後以 nonce 記錄訊息位置；結帳時以 nonce 標記連結已使用並綁定訂單，
+    同一連結無法重複結帳，付款成功後刪除該訊息。任何 Odoo 行程都能查詢。
+    """
+    _name = 'discord.payment.link'
+    _description = 'Discord 付款連結'
+    _order = 'id desc'
+
+    nonce = fields.Char('Nonce', required=True, readonly=True)
+    discord_id = fields.Char('Discord ID', required=True, readonly=True)
+    message_id = fields.Char('訊息 ID', readonly=True)
+    channel_id = fields.Char('頻道 ID', readonly=True)
+    expires_at = fields.Datetime('到期時間', required=True, index=True, readonly=True)
+    used_at = fields.Datetime('使用時間', readonly=True)
+    order_id = fields.Many2one('discord.points.order', '訂單', readonly=True, ondelete='set null')
+
+    _sql_constraints = [
+        ('nonce_unique', 'UNIQUE(nonce)', '付款連結 nonce 重複！'),
+    ]
+
+    @api.model
+    def register(self, nonce: str, discord_id: str, message_id: str, channel_id: str, expires_at: int):
+        """
+        記錄付款連結所在的私訊
+
+        :param expires_at: token 到期時間（Unix timestamp）
+        """
+        self.env.cr.execute("""
+            INSERT INTO discord_payment_link
+                   (nonce, discord_id, message_id, channel_id, expires_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, %s, to_timestamp(%s) at time zone 'UTC',
+                    %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (nonce) DO UPDATE
+               SET message_id = EXCLUDED.message_id,
+                   channel_id = EXCLUDED.channel_id
+         RETURNING order_id
+        """, [nonce, str(discord_id), message_id, channel_id, expires_at,
+              self.env.uid, self.env.uid])
+        order_id = self.env.cr.fetchone()[0]
+        if order_id:
+            # 使用者在私訊記錄前就已結帳
+            self.env['discord.points.order'].sudo().browse(order_id).write({
+                'payment_message_id': message_id,
+                'payment_channel_id': channel_id,
+            })
+
+    @api.model
+    def claim(self, nonce: str, discord_id: str, expires_at: int) -> bool:
+        """
+        標記付款連結已使用
+
+        :return: False 表示連結已使用過（重複結帳）
+        """
+        self.env.cr.execute("""
+            INSERT INTO discord_payment_link
+                   (nonce, discord_id, expires_at, used_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, to_timestamp(%s) at time zone 'UTC', now() at time zone 'UTC',
+                    %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (nonce) DO UPDATE
+               SET used_at = now() at time zone 'UTC'
+             WHERE discord_payment_link.used_at IS NULL
+               AND discord_payment_link.discord_id = EXCLUDED.discord_id
+         RETURNING id
+        """, [nonce, str(discord_id), expires_at, self.env.uid, self.env.uid])
+        return self.env.cr.fetchone() is not None
+
+    @api.model
+    def attach_to_order(self, nonce: str, order) -> bool:
+        """以 nonce 將訂單綁定到付款連結，並將私訊位置寫入訂單"""
+        self.env.cr.execute("""
+            UPDATE discord_payment_link
+               SET order_id = %s
+             WHERE nonce = %s AND order_id IS NULL
+         RETURNING message_id, channel_id
+        """, [order.id, nonce])
+        row = self.env.cr.fetchone()
+        if row is None:
+            return False
+        message_id, channel_id = row
+        if message_id and channel_id:
+            order.sudo().write({
+                'payment_message_id': message_id,
+                'payment_channel_id': channel_id,
+            })
+            _logger.info(f"已將付款連結訊息資訊附加到訂單 {order.name}")
+        return True
+
+    @api.autovacuum
+    def _gc_expired(self):
+        """清除過期的付款連結紀錄"""
+        self.env.cr.execute(
+            "DELETE FROM discord_payment_link WHERE expires_at < now() at time zone 'UTC'"
+        )
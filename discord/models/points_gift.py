@@ -1,4 +1,5 @@
 from odoo import fields, models, api
+from odoo.exceptions import UserError
 
 
 class DiscordPointsGift(models.Model):
@@ -69,22 +70,26 @@ class DiscordPointsGift(models.Model):
         if sender.id == receiver.id:
             return False, '不能贈送點數給自己！', None
 
-        # 檢查點數是否足夠
-        if sender.points < points:
+        # 建立贈送紀錄並記入帳本，餘額不足時一併回滾
+        try:
+            with self.env.cr.savepoint():
+                gift = self.sudo().create({
+                    'sender_id': sender.id,
+                    'sender_discord_id': sender_discord_id,
+                    'receiver_id': receiver.id,
+                    'receiver_discord_id': receiver_discord_id,
+                    'points': points,
+                    'note': note,
+                })
+                balances = Partner._apply_points(
+                    [(sender.id, -points, 'gift_out'), (receiver.id, points, 'gift_in')],
+                    ref=f'{self._name},{gift.id}',
+                    note=note,
+                )
+                if balances is None:
+                    raise UserError('點數不足')
+        except UserError:
+            self.env.invalidate_all()
             return False, f'點數不足！您目前有 {sender.points} 點，無法贈送 {points} 點', None
 
-        # 執行點數轉移
-        sender.write({'points': sender.points - points})
-        receiver.write({'points': receiver.points + points})
-
-        # 建立贈送紀錄
-        gift = self.sudo().create({
-            'sender_id': sender.id,
-            'sender_discord_id': sender_discord_id,
-            'receiver_id': receiver.id,
-            'receiver_discord_id': receiver_discord_id,
-            'points': points,
-            'note': note,
-        })
-
         return True, f'成功贈送 {points} 點給對方！', gift
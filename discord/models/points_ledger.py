@@ -0,0 +1,107 @@
+import logging
+
+from odoo import fields, models, api, tools
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class DiscordPointsLedger(models.Model):
+    """
+    點數帳本
+
+    所有點數異動（購買、贈送、後台調整）都新增一筆紀錄，只新增不修改。
+    res.partner.points 是帳本的物化餘額，與帳本在同一交易中更新，
+    每筆紀錄保存異動後餘額，查詢任意時間點的餘額只需讀取一筆。
+    """
+    _name = 'discord.points.ledger'
+    _description = 'Discord 點數帳本'
+    _order = 'id desc'
+
+    partner_id = fields.Many2one('res.partner', '用戶', required=True, readonly=True,
+                                 ondelete='restrict')
+    delta = fields.Integer('異動點數', required=True, readonly=True)
+    balance_after = fields.Integer('異動後餘額', required=True, readonly=True)
+    reason = fields.Selection([
+        ('opening', '期初餘額'),
+        ('purchase', '購買'),
+        ('gift_out', '贈送'),
+        ('gift_in', '受贈'),
+        ('adjust', '後台調整'),
+    ], string='原因', required=True, readonly=True)
+    ref = fields.Reference([
+        ('discord.points.order', '購買訂單'),
+        ('discord.points.gift', '贈送紀錄'),
+    ], string='來源', readonly=True)
+    note = fields.Char('備註', readonly=True)
+
+    def init(self):
+        # 依用戶查詢異動與時間點餘額
+        tools.create_index(
+            self.env.cr, 'discord_points_ledger_partner_date_idx',
+            self._table, ['partner_id', 'create_date', 'id'],
+        )
+        # 既有餘額補上期初紀錄，使帳本加總與餘額一致
+        self.env.cr.execute("""
+            INSERT INTO discord_points_ledger
+                   (partner_id, delta, balance_after, reason,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT p.id, p.points, p.points, 'opening',
+                   1, now() at time zone 'UTC', 1, now() at time zone 'UTC'
+              FROM res_partner p
+             WHERE p.points <> 0
+               AND NOT EXISTS (SELECT 1 FROM discord_points_ledger l WHERE l.partner_id = p.id)
+        """)
+
+    def write(self, vals):
+        raise UserError('點數帳本不可修改')
+
+    def unlink(self):
+        raise UserError('點數帳本不可刪除')
+
+    @api.model
+    def balance_as_of(self, partner_id: int, as_of) -> int:
+        """
+        查詢用戶在指定時間點的餘額
+
+        同一用戶的帳本 id 在取得列鎖後才配置，依 id 排序即為實際異動順序；
+        create_date 以 clock_timestamp() 寫入，同樣晚於取得鎖的時間。
+
+        :param as_of: datetime（UTC）
+        """
+        self.env.cr.execute("""
+            SELECT balance_after
+              FROM discord_points_ledger
+             WHERE partner_id = %s AND create_date <= %s
+             ORDER BY id DESC
+             LIMIT 1
+        """, [partner_id, as_of])
+        row = self.env.cr.fetchone()
+        return row[0] if row else 0
+
+    @api.model
+    def _reconcile(self) -> list:
+        """
+        比對帳本加總與物化餘額
+
+        :return: 不一致的 [(partner_id, 餘額, 帳本加總)]
+        """
+        self.env.cr.execute("""
+            SELECT p.id, p.points, COALESCE(l.total, 0)
+              FROM res_partner p
+              LEFT JOIN (
+                    SELECT partner_id, SUM(delta) AS total
+                      FROM discord_points_ledger
+                     GROUP BY partner_id
+                   ) l ON l.partner_id = p.id
+             WHERE p.points <> COALESCE(l.total, 0)
+        """)
+        mismatches = self.env.cr.fetchall()
+        for partner_id, points, total in mismatches:
+            _logger.warning(f"點數餘額與帳本不一致: partner {partner_id} 餘額 {points}，帳本 {total}")
+        return mismatches
+
+    @api.model
+    def _cron_reconcile(self):
+        mismatches = self._reconcile()
+        _logger.info(f"點數帳本對帳完成，不一致 {len(mismatches)} 筆")
@@ -1,10 +1,31 @@
+import copy
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from odoo import fields, models, api
 
 _logger = logging.getLogger(__name__)
 
+# 建立超過此時間（分鐘）仍未付款的訂單才向金流商查詢，避免查詢使用者正在付款的訂單
+RECONCILE_MIN_AGE_MINUTES = 10
+
+# 同一訂單兩次查詢的最短間隔（分鐘）
+RECONCILE_INTERVAL_MINUTES = 30
+
+# 每批查詢的訂單數
+RECONCILE_BATCH_SIZE = 100
+
+# 同時向金流商查詢的數量
+RECONCILE_CONCURRENCY = 8
+
+# 建立超過此天數仍未付款的訂單視為放棄（超商代碼、ATM 最長繳費期限為 7 天）
+EXPIRE_AFTER_DAYS = 7
+
+# 查詢訂單 TradeStatus：1 為已付款，10200095 為交易失敗
+TRADE_STATUS_PAID = '1'
+TRADE_STATUS_FAILED = '10200095'
+
 
 class DiscordPointsOrder(models.Model):
     _name = 'discord.points.order'
@@ -33,6 +54,13 @@ class DiscordPointsOrder(models.Model):
                                       help='Discord 私訊中付款連結的訊息 ID，用於付款成功後刪除')
     payment_channel_id = fields.Char(string='付款連結頻道 ID', readonly=True,
                                       help='Discord 私訊頻道 ID')
+    reconciled_at = fields.Datetime(string='最後查詢時間', readonly=True,
+                                    help='對帳排程最後一次向金流商查詢此訂單的時間')
+
+    _sql_constraints = [
+        ('name_unique', 'UNIQUE(name)', '訂單編號重複！'),
+        ('trade_no_unique', 'UNIQUE(payment_method, trade_no)', '金流交易編號重複！'),
+    ]
 
     @api.model
     def create_order(self, discord_id: str, points: int, amount: int, payment_method: str):
@@ -45,7 +73,8 @@ class DiscordPointsOrder(models.Model):
             return None
 
         # 產生唯一訂單編號 (綠界限制最長20字元)
-        order_no = f"PT{int(time.time())}"
+        # standard 序號使用 PostgreSQL sequence，並行建立不需互相等待
+        order_no = self.env['ir.sequence'].sudo().next_by_code('discord.points.order')
 
         order = self.sudo().create({
             'name': order_no,
@@ -59,39 +88,214 @@ class DiscordPointsOrder(models.Model):
 
         return order
 
-    def mark_as_paid(self, trade_no: str):
-        """標記為已付款並加點"""
-        # 記錄加點前的點數
-        points_before = self.partner_id.points if self.partner_id else 0
+    @api.model
+    def _process_payment_callback(self, payment_method: str, merchant_trade_no: str,
+                                  trade_no: str, rtn_code: str) -> bool:
+        """
+        處理金流付款回調（可重複呼叫）
 
-        self.sudo().write({
-            'state': 'paid',
-            'trade_no': trade_no,
-            'payment_date': fields.Datetime.now(),
-        })
+        金流商會重送回調，已處理過的訂單只做一次查詢即回傳，不鎖定也不動到用戶點數。
 
-        # 加點給用戶
-        if self.partner_id:
-            self.partner_id.sudo().write({
-                'points': self.partner_id.points + self.points
-            })
+        :return: 此次呼叫是否完成入帳
+        """
+        if rtn_code != '1':
+            return False
 
-        points_after = self.partner_id.points if self.partner_id else 0
+        self.env.cr.execute(
+            "SELECT id, state FROM discord_points_order WHERE name = %s AND payment_method = %s",
+            [merchant_trade_no, payment_method],
+        )
+        row = self.env.cr.fetchone()
+        if row is None:
+            _logger.warning(f"付款回調找不到訂單 {merchant_trade_no}")
+            return False
+        if row[1] != 'pending':
+            _logger.info(f"訂單 {merchant_trade_no} 已處理，忽略重複回調")
+            return False
+
+        return self.sudo().browse(row[0]).mark_as_paid(trade_no)
+
+    def mark_as_paid(self, trade_no: str) -> bool:
+        """
+        標記為已付款並加點
+
+        以條件式 UPDATE 由 pending 轉為 paid，同時到達的重複回調只有一個會成功並加點。
+
+        :return: 是否由此次呼叫完成付款
+        """
+        self.ensure_one()
+        self.env.cr.execute("""
+            UPDATE discord_points_order
+               SET state = 'paid',
+                   trade_no = %s,
+                   payment_date = now() at time zone 'UTC'
+             WHERE id = %s AND state = 'pending'
+         RETURNING id
+        """, [trade_no, self.id])
+        if self.env.cr.fetchone() is None:
+            return False
+        self.invalidate_recordset(['state', 'trade_no', 'payment_date'])
+
+        # 加點給用戶並記入帳本
+        balances = self.env['res.partner'].sudo()._apply_points(
+            [(self.partner_id.id, self.points, 'purchase')],
+            ref=f'{self._name},{self.id}',
+        )
+        points_after = balances[self.partner_id.id]
+        points_before = points_after - self.points
+        _logger.info(f"訂單 {self.name} 付款成功，加點 {self.points}")
 
         # 發送 Discord 通知
         self._send_payment_notification(points_before, points_after)
 
         return True
 
+    @api.model
+    def _set_state_if_pending(self, order_ids: list, state: str) -> list:
+        """
+        將仍為待付款的訂單轉為指定狀態
+
+        :return: 實際轉換的訂單 id
+        """
+        if not order_ids:
+            return []
+        self.env.cr.execute("""
+            UPDATE discord_points_order
+               SET state = %s
+             WHERE id IN %s AND state = 'pending'
+         RETURNING id
+        """, [state, tuple(order_ids)])
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model(['state'])
+        return ids
+
+    @api.model
+    def _claim_reconcile_batch(self, limit: int) -> list:
+        """
+        取出一批需要查詢的待付款訂單並記錄查詢時間
+
+        :return: [(id, name, payment_method)]
+        """
+        self.env.cr.execute("""
+            UPDATE discord_points_order o
+               SET reconciled_at = now() at time zone 'UTC'
+              FROM (
+                    SELECT id
+                      FROM discord_points_order
+                     WHERE state = 'pending'
+                       AND payment_method IS NOT NULL
+                       AND create_date <= now() at time zone 'UTC' - make_interval(mins => %s)
+                       AND (reconciled_at IS NULL
+                            OR reconciled_at <= now() at time zone 'UTC' - make_interval(mins => %s))
+                     ORDER BY reconciled_at NULLS FIRST, id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   ) c
+             WHERE o.id = c.id
+         RETURNING o.id, o.name, o.payment_method
+        """, [RECONCILE_MIN_AGE_MINUTES, RECONCILE_INTERVAL_MINUTES, limit])
+        return self.env.cr.fetchall()
+
+    @staticmethod
+    def _query_trade(sdk, merchant_trade_no: str) -> dict:
+        """向金流商查詢訂單（於線程池執行，不存取資料庫）"""
+        sdk = copy.copy(sdk)
+        return sdk.order_search(
+            action_url=f"{sdk.base_url}/Cashier/QueryTradeInfo/V5",
+            client_parameters={
+                'MerchantTradeNo': merchant_trade_no,
+                'TimeStamp': int(time.time()),
+            },
+        )
+
+    @api.model
+    def _cron_reconcile_pending(self):
+        """
+        對帳排程
+
+        向金流商查詢遺失回調的待付款訂單，已付款者經由與回調相同的冪等流程入帳，
+        交易失敗者標記為付款失敗，逾期未付款者標記為已取消。
+        """
+        started = time.monotonic()
+        Settings = self.env['res.config.settings']
+        sdks = {}
+        counts = {'checked': 0, 'paid': 0, 'failed': 0, 'errors': 0}
+
+        with ThreadPoolExecutor(max_workers=RECONCILE_CONCURRENCY,
+                                thread_name_prefix='discord_reconcile') as executor:
+            while True:
+                batch = self._claim_reconcile_batch(RECONCILE_BATCH_SIZE)
+                # 先提交查詢時間並釋放鎖，查詢期間不佔用訂單
+                self.env.cr.commit()
+                if not batch:
+                    break
+
+                futures = []
+                for order_id, name, payment_method in batch:
+                    if payment_method not in sdks:
+                        try:
+                            sdks[payment_method] = Settings.get_payment_sdk(payment_method)
+                        except Exception as e:
+                            _logger.error(f"對帳無法取得 {payment_method} SDK: {e}")
+                            sdks[payment_method] = None
+                    sdk = sdks[payment_method]
+                    if sdk is not None:
+                        futures.append((order_id, name, payment_method,
+                                        executor.submit(self._query_trade, sdk, name)))
+
+                failed_ids = []
+                for order_id, name, payment_method, future in futures:
+                    counts['checked'] += 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        counts['errors'] += 1
+                        _logger.warning(f"查詢訂單 {name} 失敗: {e}")
+                        continue
+
+                    status = result.get('TradeStatus')
+                    if status == TRADE_STATUS_PAID:
+                        try:
+                            with self.env.cr.savepoint():
+                                paid = self._process_payment_callback(
+                                    payment_method, name, result.get('TradeNo'), '1',
+                                )
+                        except Exception as e:
+                            self.env.invalidate_all()
+                            counts['errors'] += 1
+                            _logger.error(f"訂單 {name} 對帳入帳失敗: {e}")
+                            continue
+                        if paid:
+                            counts['paid'] += 1
+                    elif status == TRADE_STATUS_FAILED:
+                        failed_ids.append(order_id)
+
+                counts['failed'] += len(self._set_state_if_pending(failed_ids, 'failed'))
+                self.env.cr.commit()
+
+                if len(batch) < RECONCILE_BATCH_SIZE:
+                    break
+
+        # 逾期未付款的訂單視為放棄
+        self.env.cr.execute("""
+            SELECT id FROM discord_points_order
+             WHERE state = 'pending'
+               AND create_date <= now() at time zone 'UTC' - make_interval(days => %s)
+        """, [EXPIRE_AFTER_DAYS])
+        expired = self._set_state_if_pending([row[0] for row in self.env.cr.fetchall()], 'cancelled')
+
+        elapsed = time.monotonic() - started
+        rate = counts['checked'] * 60 / elapsed if elapsed else 0
+        _logger.info(
+            f"訂單對帳完成: 查詢 {counts['checked']} 筆（{rate:.0f} 筆/分鐘），"
+            f"入帳 {counts['paid']}，失敗 {counts['failed']}，查詢錯誤 {counts['errors']}，"
+            f"逾期取消 {len(expired)}"
+        )
+        return dict(counts, expired=len(expired), per_minute=rate)
+
     def _send_payment_notification(self, points_before: int, points_after: int):
         """發送付款成功的 Discord 通知"""
         try:
-            from ..services.discord_bot import discord_bot_service
-
-            if not discord_bot_service.is_running:
-                _logger.warning("Discord Bot 未運行，無法發送付款通知")
-                return
-
             # 渲染通知訊息
             result = self.env['discord.message.template'].render_message_by_type(
                 'payment_notification',
@@ -119,12 +323,12 @@ class DiscordPointsOrder(models.Model):
                     )
                 }
 
-            # 排程 Discord 通知任務
-            discord_bot_service.schedule_payment_notification(
-                discord_id=self.discord_id,
-                send_kwargs=result,
-                payment_message_id=self.payment_message_id,
-                payment_channel_id=self.payment_channel_id,
+            # 寫入私訊寄件匣，由 Bot 發送並刪除原付款連結訊息
+            self.env['discord.dm.outbox'].enqueue(
+                self.discord_id,
+                result,
+                delete_message_id=self.payment_message_id,
+                delete_channel_id=self.payment_channel_id,
             )
 
         except Exception as e:
@@ -1,12 +1,19 @@
+import copy
 import logging
 
 from ..lib.ecpay_payment_sdk import ECPayPaymentSdk
 from ..lib.opay_payment_sdk import OPayPaymentSdk
-from odoo import fields, models, api
+from odoo import fields, models, api, tools
 from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# {付款方式: (SDK 類別, 名稱, 測試環境網址, 正式環境網址)}
+PAYMENT_PROVIDERS = {
+    'ecpay': (ECPayPaymentSdk, 'ECPay', 'https://payment-stage.ecpay.com.tw', 'https://payment.ecpay.com.tw'),
+    'opay': (OPayPaymentSdk, 'OPay', 'https://payment-stage.opay.tw', 'https://payment.opay.tw'),
+}
+
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -29,6 +36,20 @@ class ResConfigSettings(models.TransientModel):
     # 贈送公告設定
     gift_announcement_channel = fields.Char('公告頻道 ID', help='贈送點數時發送公告的頻道 ID')
 
+    # 效能設定
+    discord_odoo_pool_size = fields.Integer(
+        'Odoo 線程池大小', default=4,
+        help='Bot 執行資料庫操作的線程數，重啟 Bot 後生效',
+    )
+    discord_dm_workers = fields.Integer(
+        'DM 並行發送數', default=4,
+        help='同時發送私訊的 worker 數量，重啟 Bot 後生效',
+    )
+    discord_dm_rate_limit = fields.Integer(
+        'DM 發送速率', default=5,
+        help='每 5 秒最多發送的私訊數量（全域），重啟 Bot 後生效',
+    )
+
     # 群發通知設定
     discord_announce_allowed_roles = fields.Char(
         '群發通知允許身分組',
@@ -51,56 +72,64 @@ class ResConfigSettings(models.TransientModel):
         # 其他設定
         ir_config_parameter.set_param('discord.bot_token', self.bot_token)
         ir_config_parameter.set_param('discord.point_price', self.point_price or 10)
+        # 效能設定
+        ir_config_parameter.set_param('discord.odoo_pool_size', self.discord_odoo_pool_size or 4)
+        ir_config_parameter.set_param('discord.dm_workers', self.discord_dm_workers or 4)
+        ir_config_parameter.set_param('discord.dm_rate_limit', self.discord_dm_rate_limit or 5)
         # 贈送公告設定
         ir_config_parameter.set_param('discord.gift_announcement_channel', self.gift_announcement_channel or '')
         # 群發通知設定
         ir_config_parameter.set_param('discord.announce_allowed_roles', self.discord_announce_allowed_roles or '')
 
+        # 通知所有行程中的 Bot 重新載入設定快照
+        from ..services.pg_notify import notify_bot
+        notify_bot(self.env.cr, 'config')
+
     @api.model
     def get_ecpay_sdk(self):
         """取得綠界 SDK 及相關設定"""
-        config = self.env['ir.config_parameter'].sudo()
-        merchant_id = config.get_param('discord.ecpay_merchant_id')
-        hash_key = config.get_param('discord.ecpay_hash_key')
-        hash_iv = config.get_param('discord.ecpay_hash_iv')
-        is_debug = str(config.get_param('discord.ecpay_is_debug', 'False')).lower() == 'true'
-
-        _logger.info(f"ECPay 設定: MerchantID={merchant_id}, is_debug={is_debug}")
-
-        if not merchant_id or not hash_key or not hash_iv:
-            raise UserError('缺少ECPay必要配置參數。')
-
-        if is_debug:
-            base_url = 'https://payment-stage.ecpay.com.tw'
-        else:
-            base_url = 'https://payment.ecpay.com.tw'
-
-        sdk = ECPayPaymentSdk(merchant_id, hash_key, hash_iv, is_debug)
-        sdk.base_url = base_url
-
-        return sdk
+        return self.get_payment_sdk('ecpay')
 
     @api.model
     def get_opay_sdk(self):
         """取得歐富寶 SDK 及相關設定"""
-        config = self.env['ir.config_parameter'].sudo()
-        merchant_id = config.get_param('discord.opay_merchant_id')
-        hash_key = config.get_param('discord.opay_hash_key')
-        hash_iv = config.get_param('discord.opay_hash_iv')
-        is_debug = str(config.get_param('discord.opay_is_debug', 'False')).lower() == 'true'
+        return self.get_payment_sdk('opay')
+
+    @api.model
+    def get_payment_sdk(self, payment_method: str):
+        """
+        依付款方式取得 SDK
+
+        SDK 以付款方式與目前設定值為 key 快取於 registry，設定變更後自然不會命中舊實例，
+        不需清除快取。回傳淺複製，避免 create_order 等方法在實例上暫存的參數於並行請求間互相覆蓋。
+        """
+        if payment_method not in PAYMENT_PROVIDERS:
+            raise UserError(f'不支援的付款方式: {payment_method}')
+        label = PAYMENT_PROVIDERS[payment_method][1]
 
-        _logger.info(f"OPay 設定: MerchantID={merchant_id}, is_debug={is_debug}")
+        config = self.env['ir.config_parameter'].sudo()
+        merchant_id = config.get_param(f'discord.{payment_method}_merchant_id')
+        hash_key = config.get_param(f'discord.{payment_method}_hash_key')
+        hash_iv = config.get_param(f'discord.{payment_method}_hash_iv')
+        is_debug = str(config.get_param(f'discord.{payment_method}_is_debug', 'False')).lower() == 'true'
 
         if not merchant_id or not hash_key or not hash_iv:
-            raise UserError('缺少OPay必要配置參數。')
+            raise UserError(f'缺少{label}必要配置參數。')
 
-        if is_debug:
-            base_url = 'https://payment-stage.opay.tw'
-        else:
-            base_url = 'https://payment.opay.tw'
+        return copy.copy(self._get_cached_payment_sdk(payment_method, merchant_id, hash_key, hash_iv, is_debug))
 
-        sdk = OPayPaymentSdk(merchant_id, hash_key, hash_iv, is_debug)
-        sdk.base_url = base_url
+    @api.model
+    @tools.ormcache('payment_method', 'merchant_id', 'hash_key', 'hash_iv', 'is_debug')
+    def _get_cached_payment_sdk(self, payment_method: str, merchant_id: str, hash_key: str,
+                                hash_iv: str, is_debug: bool):
+        """建立 SDK"""
+        sdk_class, label, stage_url, prod_url = PAYMENT_PROVIDERS[payment_method]
+        _logger.info(f"{label} 設定: MerchantID={merchant_id}, is_debug={is_debug}")
+
+        sdk = sdk_class(merchant_id, hash_key, hash_iv, is_debug)
+        sdk.base_url = stage_url if is_debug else prod_url
+        # 預先計算 CheckMacValue 的前後綴，淺複製的實例可直接共用
+        sdk._mac_affixes()
 
         return sdk
 
@@ -117,6 +146,17 @@ class ResConfigSettings(models.TransientModel):
         if point_price:
             res.update(point_price=int(point_price))
 
+        # 效能設定
+        odoo_pool_size = ir_config_parameter.get_param('discord.odoo_pool_size')
+        if odoo_pool_size:
+            res.update(discord_odoo_pool_size=int(odoo_pool_size))
+        dm_workers = ir_config_parameter.get_param('discord.dm_workers')
+        if dm_workers:
+            res.update(discord_dm_workers=int(dm_workers))
+        dm_rate_limit = ir_config_parameter.get_param('discord.dm_rate_limit')
+        if dm_rate_limit:
+            res.update(discord_dm_rate_limit=int(dm_rate_limit))
+
         # 綠界設定
         ecpay_merchant_id = ir_config_parameter.get_param('discord.ecpay_merchant_id')
         if ecpay_merchant_id:
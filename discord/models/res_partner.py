@@ -1,6 +1,10 @@
 from odoo import api, fields, models
 
 
+class _InsufficientPoints(Exception):
+    """扣點時餘額不足，用於回滾 savepoint"""
+
+
 class ResPartner(models.Model):
     _inherit = "res.partner"
 
@@ -11,7 +15,8 @@ class ResPartner(models.Model):
         help='Discord 用戶 ID',
         readOnly=True
     )
-    points = fields.Integer('點數', default=0, tracking=True)
+    points = fields.Integer('點數', default=0,
+                            help='點數帳本的物化餘額，異動明細見 discord.points.ledger')
     points_order_count = fields.Integer(
         string='購買訂單數', compute='_compute_points_order_count',
     )
@@ -24,6 +29,113 @@ class ResPartner(models.Model):
          '此 Discord 帳號已綁定其他用戶！'),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        # 初始點數也需記入帳本（不修改呼叫端的 vals）
+        vals_list = [dict(vals) for vals in vals_list]
+        initial = [vals.pop('points', 0) or 0 for vals in vals_list]
+        partners = super().create(vals_list)
+        moves = [(partner.id, points, 'adjust') for partner, points in zip(partners, initial) if points]
+        if moves:
+            self._apply_points(moves, allow_negative=True)
+        return partners
+
+    def write(self, vals):
+        # 後台直接修改點數時轉為帳本的調整紀錄
+        if 'points' not in vals:
+            return super().write(vals)
+        vals = dict(vals)
+        target = vals.pop('points') or 0
+        result = super().write(vals) if vals else True
+        if not self:
+            return result
+        # 先鎖定再讀取餘額，避免計算差額後到扣點前有其他異動
+        current = self._lock_points(self.ids)
+        moves = [(partner_id, target - points, 'adjust')
+                 for partner_id, points in current.items() if target != points]
+        if moves:
+            self._apply_points(moves, note='後台修改點數', allow_negative=True)
+        return result
+
+    @api.model
+    def _lock_points(self, partner_ids) -> dict:
+        """
+        依 id 順序鎖定用戶（避免死結）並讀取目前餘額
+
+        :return: {partner_id: points}
+        """
+        self.env.cr.execute(
+            "SELECT id, points FROM res_partner WHERE id IN %s ORDER BY id FOR UPDATE",
+            [tuple(partner_ids)],
+        )
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _apply_points(self, moves: list, ref: str = None, note: str = None,
+                      allow_negative: bool = False) -> dict | None:
+        """
+        異動點數並寫入帳本
+
+        依 id 順序鎖定相關用戶以避免死結，扣點以條件式 UPDATE 完成，
+        任一扣點餘額不足時整筆異動不生效。
+
+        :param moves: [(partner_id, delta, reason)]
+        :param ref: 來源紀錄，例如 'discord.points.order,42'
+        :param allow_negative: 允許餘額變為負數（後台調整）
+        :return: {partner_id: 異動後餘額}，餘額不足時回傳 None
+        """
+        cr = self.env.cr
+        partner_ids = tuple(sorted({partner_id for partner_id, _, _ in moves}))
+        self._lock_points(partner_ids)
+
+        balances = {}
+        rows = []
+        try:
+            with cr.savepoint():
+                # 先扣後加，餘額不足時盡早結束
+                for partner_id, delta, reason in sorted(moves, key=lambda m: m[1]):
+                    cr.execute("""
+                        UPDATE res_partner
+                           SET points = points + %s
+                         WHERE id = %s AND (%s OR points + %s >= 0)
+                     RETURNING points
+                    """, [delta, partner_id, allow_negative or delta >= 0, delta])
+                    row = cr.fetchone()
+                    if row is None:
+                        raise _InsufficientPoints()
+                    balances[partner_id] = row[0]
+                    rows.append((partner_id, delta, row[0], reason))
+        except _InsufficientPoints:
+            return None
+
+        # 時間取 clock_timestamp() 而非交易開始時間 now()：等待列鎖的交易若較早開始，
+        # 其紀錄時間仍會晚於先取得鎖者，帳本時間順序與餘額一致
+        partner_col, delta_col, balance_col, reason_col = map(list, zip(*rows))
+        cr.execute("""
+            INSERT INTO discord_points_ledger
+                   (partner_id, delta, balance_after, reason, ref, note,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT m.partner_id, m.delta, m.balance_after, m.reason, %s, %s,
+                   %s, clock_timestamp() at time zone 'UTC', %s, clock_timestamp() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::int[], %s::int[], %s::varchar[])
+                   AS m(partner_id, delta, balance_after, reason)
+        """, [ref, note, self.env.uid, self.env.uid,
+              partner_col, delta_col, balance_col, reason_col])
+
+        self.browse(partner_ids).invalidate_recordset(['points'])
+        self.env['discord.points.ledger'].invalidate_model()
+        return balances
+
+    def action_view_points_ledger(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': '點數帳本',
+            'res_model': 'discord.points.ledger',
+            'view_mode': 'list,form',
+            'domain': [('partner_id', '=', self.id)],
+        }
+
     @api.depends_context('uid')
     def _compute_points_order_count(self):
         order_data = self.env['discord.points.order'].sudo()._read_group(
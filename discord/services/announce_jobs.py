@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from .dm_fanout import DMFanOut
+from .dm_queue import DMPriority
+from .message_payload import FrozenPayload, load_send_kwargs
+
+_logger = logging.getLogger(__name__)
+
+# 每批發送人數，即 checkpoint 間隔；Bot 中途結束時最多重送一批
+BATCH_SIZE = 50
+
+# checkpoint 寫入失敗（例如與後台暫停操作衝突）時的重試次數
+CHECKPOINT_RETRIES = 3
+
+
+class AnnounceJobRunner:
+    """
+    執行 discord.announce.job
+
+    每個發送中的任務一個 task，依 cursor 分批交給 DMFanOut 發送，每批完成後 checkpoint。
+    後台暫停/繼續/取消時以 NOTIFY announce_job 通知，Bot 啟動時會接續所有發送中的任務。
+    """
+
+    def __init__(self, bot, odoo_executor, dm_queue, batch_size: int = BATCH_SIZE):
+        self._bot = bot
+        self._odoo_executor = odoo_executor
+        self._dm_queue = dm_queue
+        self._batch_size = batch_size
+        self._loop = None
+        # {job_id: asyncio.Task}
+        self._tasks = {}
+
+    def start(self):
+        """接續所有發送中的任務（需在 event loop 中呼叫）"""
+        self._loop = asyncio.get_running_loop()
+        self._loop.create_task(self.sync())
+
+    def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    def wake(self):
+        """任務狀態變更時呼叫（thread-safe）"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self.sync()))
+
+    async def sync(self):
+        """為尚未執行的發送中任務建立 task"""
+        try:
+            job_ids = await self._odoo_executor.run(self._running_job_ids)
+        except Exception as e:
+            _logger.error(f"讀取群發任務失敗: {e}")
+            return
+        for job_id in job_ids:
+            if job_id not in self._tasks:
+                self._tasks[job_id] = asyncio.create_task(self._run_job(job_id))
+
+    @staticmethod
+    def _running_job_ids(env):
+        return env['discord.announce.job']._running_job_ids()
+
+    @staticmethod
+    def _load_job(env, job_id):
+        job = env['discord.announce.job'].browse(job_id)
+        return {
+            'role_name': job.role_name,
+            'author_discord_id': job.author_discord_id,
+            'payload': job.payload,
+            'recipient_ids': job.recipient_ids,
+            'cursor': job.cursor,
+            'total': job.total,
+            'sent_count': job.sent_count,
+            'failed_count': job.failed_count,
+            'elapsed_seconds': job.elapsed_seconds,
+            'progress_channel_id': job.progress_channel_id,
+            'progress_message_id': job.progress_message_id,
+        }
+
+    @staticmethod
+    def _checkpoint(env, job_id, cursor, sent, failed, elapsed):
+        return env['discord.announce.job']._checkpoint(job_id, cursor, sent, failed, elapsed)
+
+    @staticmethod
+    def _save_progress_message(env, job_id, channel_id, message_id):
+        env['discord.announce.job'].browse(job_id).write({
+            'progress_channel_id': str(channel_id),
+            'progress_message_id': str(message_id),
+        })
+
+    async def _run_job(self, job_id: int):
+        state = None
+        try:
+            job = await self._odoo_executor.run(self._load_job, job_id)
+            # 整個任務共用同一份預建參數，Embed 只轉換一次
+            payload = FrozenPayload(**load_send_kwargs(job['payload']))
+            recipient_ids = job['recipient_ids']
+            cursor = job['cursor']
+            _logger.info(f"群發任務 {job_id} 從 {cursor}/{job['total']} 開始發送")
+
+            progress_message = await self._get_progress_message(job_id, job)
+            state = 'running'
+            while cursor < len(recipient_ids) and state == 'running':
+                batch_ids = recipient_ids[cursor:cursor + self._batch_size]
+                started = time.monotonic()
+
+                recipients, missing = await self._resolve_users(batch_ids)
+
+                async def on_progress(fanout):
+                    await self._update_progress(progress_message, job, fanout)
+
+                fanout = await DMFanOut(
+                    self._dm_queue, recipients, payload,
+                    priority=DMPriority.LOW, on_progress=on_progress,
+                ).run()
+
+                cursor += len(batch_ids)
+                elapsed = time.monotonic() - started
+                state = await self._write_checkpoint(
+                    job_id, cursor, fanout.sent, fanout.failed + missing, elapsed
+                )
+                if state != 'running':
+                    # 先移除 task 再更新進度訊息，期間收到的繼續通知才能重新建立 task
+                    self._release(job_id)
+                job['cursor'] = cursor
+                job['sent_count'] += fanout.sent
+                job['failed_count'] += fanout.failed + missing
+                job['elapsed_seconds'] += elapsed
+                await self._update_progress(progress_message, job, None)
+
+            _logger.info(f"群發任務 {job_id} 結束: {state} ({cursor}/{job['total']})")
+            if state == 'done':
+                await self._send_result(job)
+            elif state == 'paused':
+                # 讀到暫停後、task 移除前若已被繼續，該次 sync 會略過此任務，這裡補同步一次
+                self._loop.create_task(self.sync())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _logger.error(f"群發任務 {job_id} 執行失敗: {e}")
+        finally:
+            self._release(job_id)
+
+    def _release(self, job_id: int):
+        """移除目前 task 的登記（已由新的 task 取代時不移除）"""
+        if self._tasks.get(job_id) is asyncio.current_task():
+            del self._tasks[job_id]
+
+    async def _resolve_users(self, user_ids: list) -> tuple:
+        """
+        取得接收者，優先使用快取
+
+        :return: (users, 找不到的人數)
+        """
+        users = []
+        missing = 0
+        for user_id in user_ids:
+            try:
+                users.append(await self._get_user(user_id))
+            except (discord.HTTPException, discord.RateLimited):
+                missing += 1
+        return users, missing
+
+    async def _write_checkpoint(self, job_id, cursor, sent, failed, elapsed) -> str:
+        for attempt in range(CHECKPOINT_RETRIES):
+            try:
+                return await self._odoo_executor.run(
+                    self._checkpoint, job_id, cursor, sent, failed, elapsed
+                )
+            except Exception as e:
+                _logger.warning(f"群發任務 {job_id} 寫入進度失敗（第 {attempt + 1} 次）: {e}")
+                await asyncio.sleep(1)
+        raise RuntimeError(f"群發任務 {job_id} 無法寫入進度")
+
+    @staticmethod
+    def _progress_values(job: dict, fanout) -> dict:
+        """任務整體進度（含目前這一批）"""
+        sent = job['sent_count'] + (fanout.sent if fanout else 0)
+        failed = job['failed_count'] + (fanout.failed if fanout else 0)
+        total = job['total']
+        done = sent + failed
+        elapsed = job['elapsed_seconds']
+        if fanout and fanout.started_at:
+            elapsed += time.monotonic() - fanout.started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(total - done, 0)
+        return {
+            'role_name': job['role_name'],
+            'total': total,
+            'sent': sent,
+            'failed': failed,
+            'remaining': remaining,
+            'percent': round(done * 100 / total) if total else 100,
+            'rate': round(rate, 1),
+            'eta': round(remaining / rate) if rate > 0 else None,
+        }
+
+    async def _get_progress_message(self, job_id: int, job: dict):
+        """取得進度訊息，任務首次執行時私訊發送者"""
+        if job['progress_message_id'] and job['progress_channel_id']:
+            return self._bot.user_resolver.get_partial_message(
+                job['progress_channel_id'], job['progress_message_id']
+            )
+
+        if not job['author_discord_id']:
+            return None
+        try:
+            result = self._render_message('announce_progress', self._progress_values(job, None))
+            if not result:
+                return None
+            author = await self._get_user(int(job['author_discord_id']))
+            future = await self._dm_queue.enqueue(author, **result)
+            message = await future
+            await self._odoo_executor.run(
+                self._save_progress_message, job_id, message.channel.id, message.id
+            )
+            return message
+        except Exception as e:
+            _logger.error(f"發送群發進度通知失敗: {e}")
+            return None
+
+    async def _update_progress(self, progress_message, job: dict, fanout):
+        """編輯進度訊息"""
+        if progress_message is None:
+            return
+        try:
+            result = self._render_message('announce_progress', self._progress_values(job, fanout))
+            if result:
+                await progress_message.edit(**result)
+        except discord.RateLimited as e:
+            # 進度訊息只是顯示用，被限制時略過這次更新，不延遲發送
+            _logger.info(f"更新群發進度遇到速率限制，略過（{e.retry_after:.1f} 秒）")
+        except Exception as e:
+            _logger.error(f"更新群發進度失敗: {e}")
+
+    async def _send_result(self, job: dict):
+        """任務完成後回報結果給發送者"""
+        if not job['author_discord_id']:
+            return
+        try:
+            result = self._render_message('announce_result', {
+                'role_name': job['role_name'],
+                'total': job['total'],
+                'success': job['sent_count'],
+                'failed': job['failed_count'],
+            })
+            if result:
+                author = await self._get_user(int(job['author_discord_id']))
+                future = await self._dm_queue.enqueue(author, **result)
+                await future
+        except Exception as e:
+            _logger.error(f"發送群發結果通知失敗: {e}")
+
+    def _render_message(self, template_type: str, values: dict) -> dict | None:
+        """以設定快照中的模板渲染，不存取資料庫"""
+        return self._bot.config_store.snapshot.render_message(template_type, values)
+
+    async def _get_user(self, user_id: int):
+        return await self._bot.user_resolver.get_user(user_id)
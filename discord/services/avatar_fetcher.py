@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import logging
+from collections import OrderedDict
+
+import aiohttp
+from odoo.tools.image import image_process
+
+_logger = logging.getLogger(__name__)
+
+# 向 Discord CDN 要求的頭像尺寸（像素，需為 2 的次方）
+AVATAR_SIZE = 256
+
+# 頭像下載上限（位元組），超過即中止
+MAX_AVATAR_BYTES = 1024 * 1024
+
+# 串流讀取的區塊大小
+CHUNK_SIZE = 64 * 1024
+
+# 同時下載的頭像數量
+AVATAR_CONCURRENCY = 4
+
+# 記住最近同步的頭像數量，頭像未變更時不重新下載
+RECENT_CACHE_SIZE = 10000
+
+
+class AvatarFetcher:
+    """
+    頭像下載與同步
+
+    全 Bot 共用一個 aiohttp session（連線池）；向 CDN 要求 AVATAR_SIZE 的 PNG，
+    串流讀取並限制大小，解碼與縮圖交給線程池，不阻塞 event loop。
+    refresh() 於背景同步頭像到 res.partner，頭像未變更時略過。
+    """
+
+    def __init__(self, odoo_executor):
+        self._odoo_executor = odoo_executor
+        self._session: aiohttp.ClientSession | None = None
+        # {discord_id: 最近同步的頭像 key}
+        self._recent = OrderedDict()
+        # {discord_id: 同步中的 task}
+        self._pending = {}
+
+    def start(self):
+        """建立共用 session（需在 event loop 中呼叫）"""
+        if self._session is not None:
+            return
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=AVATAR_CONCURRENCY, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=15, connect=5),
+        )
+
+    async def close(self):
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, user) -> str | None:
+        """
+        下載使用者頭像並縮圖
+
+        :return: base64 字串，失敗時回傳 None
+        """
+        if self._session is None:
+            return None
+        try:
+            avatar = user.display_avatar
+            if not avatar:
+                return None
+
+            url = avatar.replace(size=AVATAR_SIZE, format='png').url
+            async with self._session.get(url) as resp:
+                if resp.status != 200:
+                    _logger.warning(f"取得頭像失敗: HTTP {resp.status}")
+                    return None
+                if (resp.content_length or 0) > MAX_AVATAR_BYTES:
+                    _logger.warning(f"頭像大小 {resp.content_length} 超過上限，略過")
+                    return None
+
+                data = bytearray()
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    data.extend(chunk)
+                    if len(data) > MAX_AVATAR_BYTES:
+                        _logger.warning("頭像大小超過上限，略過")
+                        return None
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._process, bytes(data))
+        except Exception as e:
+            _logger.warning(f"取得頭像失敗: {e}")
+        return None
+
+    @staticmethod
+    def _process(data: bytes) -> str:
+        """解碼並縮圖（於線程池執行）"""
+        image = image_process(data, size=(AVATAR_SIZE, AVATAR_SIZE), verify_resolution=True)
+        return base64.b64encode(image).decode('ascii')
+
+    def refresh(self, user):
+        """
+        於背景同步使用者頭像到 res.partner（不等待完成）
+
+        頭像 key 與上次同步相同、或同一使用者已在同步中時略過。
+        """
+        discord_id = str(user.id)
+        avatar = user.display_avatar
+        key = avatar.key if avatar else None
+        if discord_id in self._pending or self._recent.get(discord_id) == key:
+            return
+
+        task = asyncio.create_task(self._refresh(user, discord_id, key))
+        self._pending[discord_id] = task
+        task.add_done_callback(lambda _: self._pending.pop(discord_id, None))
+
+    async def _refresh(self, user, discord_id: str, key):
+        image = await self.fetch(user)
+        if image is None:
+            return
+        try:
+            await self._odoo_executor.run(self._store, discord_id, image)
+        except Exception as e:
+            _logger.warning(f"同步頭像失敗: {e}")
+            return
+
+        self._recent[discord_id] = key
+        self._recent.move_to_end(discord_id)
+        while len(self._recent) > RECENT_CACHE_SIZE:
+            self._recent.popitem(last=False)
+
+    @staticmethod
+    def _store(env, discord_id: str, image: str):
+        """寫入頭像（於 Odoo 線程池執行）"""
+        partner = env['res.partner'].sudo().search([('discord_id', '=', discord_id)], limit=1)
+        if partner:
+            partner.write({'image_1920': image})
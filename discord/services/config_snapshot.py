@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from .template_index import build_index
+
+_logger = logging.getLogger(__name__)
+
+# 定期重新載入間隔（秒），設定變更平時由 Postgres NOTIFY 即時通知，此為保底
+REFRESH_INTERVAL = 600
+
+# Bot 需要的 ir.config_parameter
+SNAPSHOT_PARAMS = (
+    'web.base.url',
+    # 付款連結簽章金鑰來源
+    'database.secret',
+    'discord.point_price',
+    'discord.gift_announcement_channel',
+    'discord.announce_allowed_roles',
+)
+
+_EMPTY = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Bot 設定快照（不可變）
+
+    一次 DB 往返載入頻道、指令、自動刪除、訊息模板與系統參數，整個物件以原子方式替換，
+    讀取端不需要加鎖。
+    """
+    # {channel_type: frozenset(channel_id)}
+    channels: MappingProxyType = field(default=_EMPTY)
+    # {command_name(小寫): command_type}
+    commands: MappingProxyType = field(default=_EMPTY)
+    # {channel_id: {'delay', 'delete_admin', 'delete_bot', 'delete_user'}}
+    autodelete: MappingProxyType = field(default=_EMPTY)
+    # {key: value}
+    params: MappingProxyType = field(default=_EMPTY)
+    # {template_type: TemplateVariants}，模板已編譯
+    templates: MappingProxyType = field(default=_EMPTY)
+    loaded_at: float = 0.0
+
+    def allowed_channels(self, channel_type: str) -> frozenset:
+        """取得允許的頻道，空集合表示允許全部"""
+        return self.channels.get(channel_type, frozenset())
+
+    def get_param(self, key: str, default=None):
+        """取得系統參數"""
+        value = self.params.get(key)
+        return value if value else default
+
+    def render_message(self, template_type: str, values: dict) -> dict | None:
+        """
+        依權重選用該類型的模板並渲染，不存取資料庫
+
+        :return: send() kwargs，沒有啟用的模板時回傳 None
+        """
+        variants = self.templates.get(template_type)
+        if variants is None:
+            return None
+        return variants.pick().render_message(values)
+
+    @classmethod
+    def load(cls, env) -> 'ConfigSnapshot':
+        """以單一 SQL 載入所有設定"""
+        env.cr.execute("""
+            SELECT
+                (SELECT COALESCE(json_agg(json_build_array(channel_type, channel_id)), '[]')
+                   FROM discord_channel_config),
+                (SELECT COALESCE(json_agg(json_build_array(command_name, command_type)), '[]')
+                   FROM discord_command_config
+                  WHERE active),
+                (SELECT COALESCE(json_agg(json_build_object(
+                            'channel_id', channel_id,
+                            'delay', delete_delay,
+                            'delete_admin', delete_admin,
+                            'delete_bot', delete_bot,
+                            'delete_user', delete_user)), '[]')
+                   FROM discord_channel_autodelete
+                  WHERE active),
+                (SELECT COALESCE(json_object_agg(key, value), '{}')
+                   FROM ir_config_parameter
+                  WHERE key IN %s),
+                (SELECT COALESCE(json_agg(json_build_object(
+                            'id', id,
+                            'template_type', template_type,
+                            'body', body,
+                            'use_embed', use_embed,
+                            'embed_title', embed_title,
+                            'embed_color', embed_color,
+                            'embed_image_url', embed_image_url,
+                            'embed_thumbnail_url', embed_thumbnail_url,
+                            'embed_footer', embed_footer,
+                            'weight', weight) ORDER BY id), '[]')
+                   FROM discord_message_template
+                  WHERE active)
+        """, [SNAPSHOT_PARAMS])
+        channel_rows, command_rows, autodelete_rows, params, template_rows = env.cr.fetchone()
+
+        channels = {}
+        for channel_type, channel_id in channel_rows:
+            channels.setdefault(channel_type, set()).add(int(channel_id))
+
+        autodelete = {
+            int(row['channel_id']): MappingProxyType({
+                'delay': row['delay'] or 0,
+                'delete_admin': bool(row['delete_admin']),
+                'delete_bot': bool(row['delete_bot']),
+                'delete_user': bool(row['delete_user']),
+            })
+            for row in autodelete_rows
+        }
+
+        return cls(
+            channels=MappingProxyType({k: frozenset(v) for k, v in channels.items()}),
+            commands=MappingProxyType({name.lower(): command_type for name, command_type in command_rows}),
+            autodelete=MappingProxyType(autodelete),
+            params=MappingProxyType(params),
+            templates=build_index(template_rows),
+            loaded_at=time.time(),
+        )
+
+
+class ConfigStore:
+    """
+    持有目前的設定快照，並在背景重新載入
+
+    invalidate() 可從任何線程呼叫，多次失效會合併為一次重新載入。
+    """
+
+    def __init__(self, odoo_executor, refresh_interval: float = REFRESH_INTERVAL):
+        self._odoo_executor = odoo_executor
+        self._refresh_interval = refresh_interval
+        self._snapshot = ConfigSnapshot()
+        self._loop = None
+        self._reload_event: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        return self._snapshot
+
+    async def start(self):
+        """載入初始快照並啟動背景重新載入（需在 event loop 中呼叫）"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._reload_event = asyncio.Event()
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def invalidate(self):
+        """要求背景重新載入（thread-safe）"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._reload_event.set)
+
+    async def reload(self):
+        """重新載入快照，失敗時保留舊快照"""
+        try:
+            self._snapshot = await self._odoo_executor.run(ConfigSnapshot.load)
+        except Exception as e:
+            _logger.error(f"載入 Bot 設定快照失敗: {e}")
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._reload_event.wait(), timeout=self._refresh_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._reload_event.clear()
+                await self.reload()
+        except asyncio.CancelledError:
+            pass
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import threading
+import time
 import warnings
 
 # 忽略 discord.py 的 DeprecationWarning (aiohttp timeout 參數)
@@ -11,13 +12,29 @@ import discord
 from discord.ext import commands
 
 from ..cogs import COGS
-from .dm_queue import DMQueue
+from .announce_jobs import AnnounceJobRunner
+from .avatar_fetcher import AvatarFetcher
+from .config_snapshot import ConfigStore
+from .dm_outbox import OutboxDrainer
+from .dm_queue import DMQueue, DEFAULT_WORKERS, DEFAULT_RATE_LIMIT, MAX_RATELIMIT_TIMEOUT
+from .leader_election import LeaderElector
+from .odoo_executor import OdooExecutor, DEFAULT_POOL_SIZE, odoo_env
+from .pg_notify import NotifyListener
+from .user_resolver import UserResolver
 
 _logger = logging.getLogger(__name__)
 
+# gateway 線程意外結束（例如 Token 錯誤）後，leader 重新連線的最短間隔（秒）
+GATEWAY_RETRY_INTERVAL = 60.0
+
 
 class DiscordBotService:
-    """Discord Bot 服務 - 在獨立線程中運行"""
+    """
+    Discord Bot 服務 - 在獨立線程中運行
+
+    每個 Odoo 行程都會參與 leader election，只有當選的行程會連線 Discord gateway。
+    gateway 的啟動、停止與重啟都在選舉線程中執行，restart 通知由選舉連線接收，不依賴 gateway 是否已連線。
+    """
 
     _instance = None
     _lock = threading.Lock()
@@ -38,9 +55,19 @@ class DiscordBotService:
         self._loop = None
         self._running = False
         self._db_name = None
-        # 暫存付款連結訊息資訊，用於付款成功後刪除
-        # key: discord_id, value: {'message_id': str, 'channel_id': str}
-        self._pending_payment_messages = {}
+        self._elector = None
+        self._odoo_executor = None
+        self._config_store = None
+        self._notify_listener = None
+        self._outbox_drainer = None
+        self._announce_jobs = None
+        self._avatar_fetcher = None
+        # 上次嘗試連線 gateway 的時間（time.monotonic()）
+        self._gateway_started_at = 0.0
+        # 連線 gateway 時讀取的設定
+        self._settings = {}
+        # 指令路由：{command_type: cog}，指令名稱對應表在設定快照中
+        self._command_handlers = {}
 
     def _setup_bot(self, token: str):
         """設定 Discord Bot"""
@@ -48,58 +75,183 @@ class DiscordBotService:
         intents.message_content = True
         intents.members = True
 
-        self._bot = commands.Bot(command_prefix="!", intents=intents)
+        # 路由限制等待過久時拋出 RateLimited 交由 DMQueue 延後，不讓 worker 長時間等待
+        self._bot = commands.Bot(
+            command_prefix="!", intents=intents, max_ratelimit_timeout=MAX_RATELIMIT_TIMEOUT,
+        )
+        # 所有 Cog 的資料庫操作透過此線程池執行，不阻塞 event loop
+        self._bot.odoo_executor = self._odoo_executor
+        # 全域共用的設定快照
+        self._bot.config_store = self._config_store
+        # 使用者與訊息解析：優先使用快取，避免每次發送都呼叫 REST
+        self._bot.user_resolver = UserResolver(self._bot)
 
         @self._bot.event
         async def on_ready():
             _logger.info(f"Discord Bot 已上線: {self._bot.user}")
-            # 初始化 DM 佇列
-            self._bot.dm_queue = DMQueue()
-            self._bot.dm_queue.start()
-            # 載入所有 Cogs
-            await self._load_cogs()
+            # 載入設定快照並啟動背景重新載入
+            await self._config_store.start()
+            # 監聽其他 Odoo 行程發出的設定變更通知
+            if self._notify_listener is None:
+                # restart 由選舉連線處理（見 _on_leader_notify）
+                self._notify_listener = NotifyListener(self._db_name, {
+                    'config': self._config_store.invalidate,
+                    'dm_outbox': self._wake_outbox,
+                    'announce_job': self._wake_announce_jobs,
+                }, resync_events=('config', 'dm_outbox', 'announce_job'))
+                self._notify_listener.start()
+            # on_ready 在重新連線後會再次觸發，佇列與 Cogs 只初始化一次
+            if getattr(self._bot, 'dm_queue', None) is None:
+                # 初始化 DM 佇列
+                self._bot.dm_queue = DMQueue(
+                    rate_limit=self._settings['dm_rate_limit'],
+                    workers=self._settings['dm_workers'],
+                )
+                self._bot.dm_queue.start()
+                # 發送寄件匣中的私訊（含重啟前未完成的）
+                self._outbox_drainer = OutboxDrainer(
+                    self._bot, self._odoo_executor, self._bot.dm_queue
+                )
+                self._outbox_drainer.start()
+                # 接續未完成的群發任務
+                self._announce_jobs = AnnounceJobRunner(
+                    self._bot, self._odoo_executor, self._bot.dm_queue
+                )
+                self._bot.announce_jobs = self._announce_jobs
+                self._announce_jobs.start()
+                # 全 Bot 共用的頭像下載 session
+                self._avatar_fetcher = AvatarFetcher(self._odoo_executor)
+                self._bot.avatar_fetcher = self._avatar_fetcher
+                self._avatar_fetcher.start()
+                # 載入所有 Cogs
+                await self._load_cogs()
 
         @self._bot.event
         async def on_message(message):
-            if message.author == self._bot.user:
+            if message.author.bot:
                 return
-            await self._bot.process_commands(message)
+            await self._dispatch_command(message)
 
         return token
 
     async def _load_cogs(self):
-        """載入所有 Cogs"""
+        """載入所有 Cogs，並建立 command_type → Cog 的路由表"""
+        self._command_handlers = {}
         for cog_class in COGS:
             try:
-                await self._bot.add_cog(cog_class(self._bot, self._db_name))
+                cog = cog_class(self._bot, self._db_name)
+                await self._bot.add_cog(cog)
+                if cog.command_type:
+                    self._command_handlers[cog.command_type] = cog
                 _logger.info(f"已載入 Cog: {cog_class.__name__}")
             except Exception as e:
                 _logger.error(f"載入 Cog {cog_class.__name__} 失敗: {e}")
 
+    async def _dispatch_command(self, message):
+        """
+        指令路由：每則訊息只解析一次，查表後只呼叫對應 Cog 的 handle_command
+
+        非 ! 開頭的訊息立即返回；指令表與頻道設定皆讀取記憶體快照，不觸碰資料庫。
+        """
+        content = message.content
+        if not content.startswith('!'):
+            return
+
+        parts = content[1:].split()
+        if not parts:
+            return
+
+        cmd_name = parts[0].lower()
+        command_type = self._config_store.snapshot.commands.get(cmd_name)
+        if command_type is None:
+            return
+
+        cog = self._command_handlers.get(command_type)
+        if cog is None:
+            return
+
+        # 檢查頻道權限
+        if not cog.is_channel_allowed(message.channel.id):
+            return
+
+        await cog.handle_command(message, cmd_name, parts[1:])
+
     def _run_bot(self, token: str):
         """在獨立線程中運行 Bot"""
-        self._loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self._loop)
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        asyncio.set_event_loop(loop)
 
         try:
-            self._loop.run_until_complete(self._bot.start(token))
+            loop.run_until_complete(self._bot.start(token))
         except Exception as e:
             _logger.error(f"Discord Bot 執行錯誤: {e}")
         finally:
-            self._loop.close()
-            self._running = False
+            loop.close()
+            # 已被新的 gateway 取代時不覆寫新的狀態
+            if self._thread is threading.current_thread():
+                self._running = False
+
+    def start(self, db_name: str):
+        """
+        啟動 Discord Bot 服務：參與 leader election，當選後才連線 gateway
+
+        :param db_name: Odoo 資料庫名稱
+        """
+        if self._elector is not None:
+            _logger.warning("Discord Bot 服務已在運行中")
+            return
+
+        self._db_name = db_name
+        self._elector = LeaderElector(
+            db_name,
+            on_elected=self._start_gateway,
+            on_demoted=self._stop_gateway,
+            on_notify=self._on_leader_notify,
+            on_heartbeat=self._check_gateway,
+        )
+        self._elector.start()
+        _logger.info("Discord Bot 服務已啟動，等待 leader election")
 
-    def start(self, db_name: str, token: str):
-        """啟動 Discord Bot 服務"""
+    def stop(self):
+        """停止 Discord Bot 服務並釋放 leadership"""
+        if self._elector is not None:
+            self._elector.stop()
+            self._elector = None
+        self._stop_gateway()
+
+    def _load_settings(self) -> dict:
+        """讀取 Bot Token 與效能設定（每次連線 gateway 前重新讀取）"""
+        def _int_param(config, key, default):
+            try:
+                return int(config.get_param(key, default))
+            except ValueError:
+                return default
+
+        with odoo_env(self._db_name) as env:
+            config = env['ir.config_parameter'].sudo()
+            return {
+                'token': config.get_param('discord.bot_token'),
+                'odoo_pool_size': _int_param(config, 'discord.odoo_pool_size', DEFAULT_POOL_SIZE),
+                'dm_workers': _int_param(config, 'discord.dm_workers', DEFAULT_WORKERS),
+                'dm_rate_limit': _int_param(config, 'discord.dm_rate_limit', DEFAULT_RATE_LIMIT),
+            }
+
+    def _start_gateway(self):
+        """連線 Discord gateway（當選 leader 後呼叫）"""
         if self._running:
             _logger.warning("Discord Bot 已在運行中")
             return
 
+        self._gateway_started_at = time.monotonic()
+        self._settings = self._load_settings()
+        token = self._settings['token']
         if not token:
             _logger.warning("未設定 Discord Bot Token，跳過啟動")
             return
 
-        self._db_name = db_name
+        self._odoo_executor = OdooExecutor(self._db_name, self._settings['odoo_pool_size'])
+        self._config_store = ConfigStore(self._odoo_executor)
         self._setup_bot(token)
         self._running = True
 
@@ -110,146 +262,144 @@ class DiscordBotService:
             name="DiscordBotThread"
         )
         self._thread.start()
-        _logger.info("Discord Bot 服務已啟動")
+        _logger.info("Discord Bot 已啟動")
 
-    def stop(self):
-        """停止 Discord Bot 服務"""
-        if not self._running:
+    def _stop_gateway(self):
+        """中斷 Discord gateway 連線"""
+        if not self._running and self._odoo_executor is None:
             return
 
-        if self._bot and self._loop:
-            # 停止 DM 佇列
-            if hasattr(self._bot, 'dm_queue'):
-                self._bot.dm_queue.stop()
+        if self._bot and self._loop and not self._loop.is_closed():
+            # 停止寄件匣、群發任務與 DM 佇列
+            if self._outbox_drainer:
+                self._loop.call_soon_threadsafe(self._outbox_drainer.stop)
+                self._outbox_drainer = None
+            if self._announce_jobs:
+                self._loop.call_soon_threadsafe(self._announce_jobs.stop)
+                self._announce_jobs = None
+            if getattr(self._bot, 'dm_queue', None):
+                self._loop.call_soon_threadsafe(self._bot.dm_queue.stop)
+            if self._config_store:
+                self._loop.call_soon_threadsafe(self._config_store.stop)
+            if self._notify_listener:
+                self._loop.call_soon_threadsafe(self._notify_listener.stop)
+                self._notify_listener = None
+            if self._avatar_fetcher:
+                asyncio.run_coroutine_threadsafe(self._avatar_fetcher.close(), self._loop)
+                self._avatar_fetcher = None
             asyncio.run_coroutine_threadsafe(self._bot.close(), self._loop)
+        else:
+            # gateway 線程已自行結束，event loop 已關閉，只需釋放 Postgres 連線
+            if self._notify_listener:
+                self._notify_listener.stop()
+            self._notify_listener = None
+            self._outbox_drainer = None
+            self._announce_jobs = None
+            self._avatar_fetcher = None
+
+        if self._odoo_executor:
+            self._odoo_executor.shutdown()
+            self._odoo_executor = None
 
         self._running = False
-        _logger.info("Discord Bot 服務已停止")
+        _logger.info("Discord Bot 已停止")
 
-    @property
-    def is_running(self):
-        return self._running
+    def _wake_outbox(self):
+        """收到 dm_outbox 通知時立即處理寄件匣"""
+        if self._outbox_drainer:
+            self._outbox_drainer.wake()
 
-    def clear_channel_cache(self):
-        """清除所有 Cog 的頻道快取"""
-        if not self._bot:
-            return
-
-        for cog in self._bot.cogs.values():
-            if hasattr(cog, 'clear_channel_cache'):
-                cog.clear_channel_cache()
-        _logger.info("已清除所有 Cog 的頻道快取")
-
-    def clear_command_cache(self):
-        """清除所有 Cog 的指令快取"""
-        if not self._bot:
-            return
-
-        for cog in self._bot.cogs.values():
-            if hasattr(cog, 'clear_command_cache'):
-                cog.clear_command_cache()
-        _logger.info("已清除所有 Cog 的指令快取")
-
-    def clear_autodelete_cache(self):
-        """清除自動刪除頻道快取"""
-        if not self._bot:
-            return
-
-        for cog in self._bot.cogs.values():
-            if hasattr(cog, 'clear_autodelete_cache'):
-                cog.clear_autodelete_cache()
-        _logger.info("已清除自動刪除頻道快取")
+    def _wake_announce_jobs(self):
+        """收到 announce_job 通知時同步群發任務狀態"""
+        if self._announce_jobs:
+            self._announce_jobs.wake()
 
-    def store_pending_payment_message(self, discord_id: str, message_id: str, channel_id: str):
-        """
-        暫存付款連結訊息資訊
-
-        :param discord_id: Discord 用戶 ID
-        :param message_id: 訊息 ID
-        :param channel_id: 頻道 ID
-        """
-        self._pending_payment_messages[discord_id] = {
-            'message_id': message_id,
-            'channel_id': channel_id,
-        }
-        _logger.info(f"已暫存付款連結訊息: discord_id={discord_id}, message_id={message_id}")
-
-    def get_pending_payment_message(self, discord_id: str) -> dict | None:
-        """
-        取得並移除暫存的付款連結訊息資訊
+    def _gateway_alive(self) -> bool:
+        """gateway 線程是否仍在執行"""
+        return self._thread is not None and self._thread.is_alive()
 
-        :param discord_id: Discord 用戶 ID
-        :return: {'message_id': str, 'channel_id': str} 或 None
+    def _on_leader_notify(self, event: str):
         """
-        return self._pending_payment_messages.pop(discord_id, None)
+        leader 的選舉連線收到通知（於選舉線程執行）
 
-    def schedule_payment_notification(self, discord_id: str, send_kwargs: dict,
-                                       payment_message_id: str = None,
-                                       payment_channel_id: str = None):
+        - restart：重新讀取 Token 並重連 gateway
+        - config：gateway 未運行時（例如先前未設定 Token）嘗試重新連線；運行中則由 NotifyListener 處理
         """
-        排程付款成功通知
+        if event == 'restart':
+            self._restart_gateway()
+        elif event == 'config' and not self._gateway_alive():
+            self._restart_gateway()
+
+    def _check_gateway(self):
+        """leader 心跳時檢查 gateway 線程，意外結束時每 GATEWAY_RETRY_INTERVAL 秒重試一次"""
+        if self._gateway_alive():
+            return
+        if time.monotonic() - self._gateway_started_at < GATEWAY_RETRY_INTERVAL:
+            return
+        _logger.warning("Discord Bot gateway 未運行，重新連線")
+        self._restart_gateway()
 
-        :param discord_id: Discord 用戶 ID
-        :param send_kwargs: 傳給 user.send() 的 kwargs dict
-        :param payment_message_id: 原付款連結訊息 ID（用於刪除）
-        :param payment_channel_id: 原付款連結頻道 ID（用於刪除）
-        """
-        if not self._running or not self._loop or not self._bot:
-            _logger.warning("Discord Bot 未運行，無法排程付款通知")
+    def _restart_gateway(self):
+        """停止並重新連線 gateway（於選舉線程執行）"""
+        if not self.is_leader:
             return
+        thread = self._thread
+        self._stop_gateway()
+        if thread and thread.is_alive():
+            thread.join(10)
+            if thread.is_alive():
+                # 舊線程結束前啟動新 gateway 會與其狀態互相覆寫，留待下次心跳重試
+                _logger.error("舊的 Discord Bot 線程尚未結束，暫不重新連線")
+                return
+        try:
+            self._start_gateway()
+        except Exception as e:
+            _logger.error(f"重啟 Discord Bot 失敗: {e}")
 
-        asyncio.run_coroutine_threadsafe(
-            self._send_payment_notification(
-                discord_id, send_kwargs, payment_message_id, payment_channel_id
-            ),
-            self._loop
-        )
+    @property
+    def is_running(self):
+        """本行程的 Bot 是否已連線 gateway"""
+        return self._running
 
-    async def _send_payment_notification(self, discord_id: str, send_kwargs: dict,
-                                          payment_message_id: str = None,
-                                          payment_channel_id: str = None):
-        """
-        發送付款成功通知並刪除原付款連結訊息
+    @property
+    def is_started(self):
+        """本行程是否已參與 leader election"""
+        return self._elector is not None
 
-        :param discord_id: Discord 用戶 ID
-        :param send_kwargs: 傳給 user.send() 的 kwargs dict
-        :param payment_message_id: 原付款連結訊息 ID（用於刪除）
-        :param payment_channel_id: 原付款連結頻道 ID（用於刪除）
+    @property
+    def is_leader(self):
+        """本行程是否為 leader"""
+        return bool(self._elector and self._elector.is_leader)
+
+    def get_executor_stats(self) -> dict | None:
+        """取得 Odoo 線程池統計（佇列深度、等待時間），未運行時回傳 None"""
+        if not self._odoo_executor:
+            return None
+        return self._odoo_executor.stats()
+
+    def get_dm_queue_stats(self) -> dict | None:
+        """取得 DM 佇列統計，未運行時回傳 None"""
+        if not self._bot or not getattr(self._bot, 'dm_queue', None):
+            return None
+        return self._bot.dm_queue.stats()
+
+    def get_user_resolver_stats(self) -> dict | None:
+        """取得使用者解析快取統計，未運行時回傳 None"""
+        if not self._bot or not getattr(self._bot, 'user_resolver', None):
+            return None
+        return self._bot.user_resolver.stats()
+
+    def invalidate_config(self):
         """
-        try:
-            # 取得用戶
-            user = await self._bot.fetch_user(int(discord_id))
-            if not user:
-                _logger.warning(f"找不到 Discord 用戶: {discord_id}")
-                return
+        通知本行程的 Bot 重新載入設定快照（thread-safe）
 
-            # 透過 DM 佇列發送付款成功通知
-            future = await self._bot.dm_queue.enqueue(user, **send_kwargs)
-            await future
-            _logger.info(f"已發送付款通知給用戶 {discord_id}")
-
-            # 刪除原付款連結訊息
-            if payment_message_id and payment_channel_id:
-                try:
-                    channel = await self._bot.fetch_channel(int(payment_channel_id))
-                    if channel:
-                        original_message = await channel.fetch_message(int(payment_message_id))
-                        if original_message:
-                            await original_message.delete()
-                            _logger.info(f"已刪除原付款連結訊息 {payment_message_id}")
-                except discord.NotFound:
-                    _logger.warning(f"找不到原付款連結訊息 {payment_message_id}，可能已被刪除")
-                except discord.Forbidden:
-                    _logger.warning(f"無權限刪除訊息 {payment_message_id}")
-                except Exception as e:
-                    _logger.error(f"刪除原付款連結訊息失敗: {e}")
-
-        except discord.NotFound:
-            _logger.warning(f"找不到 Discord 用戶: {discord_id}")
-        except discord.Forbidden:
-            _logger.warning(f"無法私訊用戶 {discord_id}，可能已關閉私訊")
-        except Exception as e:
-            _logger.error(f"發送付款通知失敗: {e}")
+        多次呼叫會合併為一次背景重新載入。
+        設定變更請使用 pg_notify.notify_bot(cr, 'config')，可通知所有行程。
+        """
+        if not self._config_store:
+            return
+        self._config_store.invalidate()
+        _logger.info("已要求 Bot 重新載入設定快照")
 
 
 # 全域實例
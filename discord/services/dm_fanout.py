@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+
+from .dm_queue import DMPriority
+from .message_payload import FrozenPayload
+
+_logger = logging.getLogger(__name__)
+
+# 進度回報間隔（秒）
+PROGRESS_INTERVAL = 10.0
+
+
+class DMFanOut:
+    """
+    同一則訊息群發給多位接收者
+
+    一次將所有接收者加入 DM 佇列，由佇列的 worker 並行發送，
+    以 asyncio.as_completed 依完成順序收集結果，並定期回報進度。
+    """
+
+    def __init__(self, dm_queue, recipients, send_kwargs: dict | FrozenPayload,
+                 priority=DMPriority.LOW, on_progress=None,
+                 progress_interval: float = PROGRESS_INTERVAL):
+        """
+        :param dm_queue: DMQueue
+        :param recipients: 接收者列表
+        :param send_kwargs: 傳給 recipient.send() 的參數，或已建立的 FrozenPayload（多批共用）
+        :param priority: 優先度
+        :param on_progress: async callable(fanout)，發送期間每 progress_interval 秒呼叫一次
+        :param progress_interval: 進度回報間隔（秒）
+        """
+        self._dm_queue = dm_queue
+        self._recipients = list(recipients)
+        if isinstance(send_kwargs, FrozenPayload):
+            self._payload = send_kwargs
+        else:
+            self._payload = FrozenPayload(**send_kwargs)
+        self._priority = priority
+        self._on_progress = on_progress
+        self._progress_interval = progress_interval
+        self.total = len(self._recipients)
+        self.sent = 0
+        self.failed = 0
+        self.started_at = None
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.sent - self.failed
+
+    def progress(self) -> dict:
+        """目前進度，可直接作為模板變數"""
+        done = self.sent + self.failed
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return {
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'remaining': self.remaining,
+            'percent': round(done * 100 / self.total) if self.total else 100,
+            'rate': round(rate, 1),
+            'eta': round(self.remaining / rate) if rate > 0 else None,
+        }
+
+    async def run(self) -> 'DMFanOut':
+        """發送並等待全部完成"""
+        self.started_at = time.monotonic()
+        futures = await self._dm_queue.enqueue_many(
+            self._recipients, priority=self._priority, payload=self._payload
+        )
+
+        last_report = self.started_at
+        for future in asyncio.as_completed(futures):
+            try:
+                await future
+                self.sent += 1
+            except Exception:
+                # 錯誤已由 DMQueue 記錄
+                self.failed += 1
+
+            now = time.monotonic()
+            if self._on_progress and self.remaining and now - last_report >= self._progress_interval:
+                last_report = now
+                await self._report()
+
+        return self
+
+    async def _report(self):
+        try:
+            await self._on_progress(self)
+        except Exception as e:
+            _logger.error(f"回報群發進度失敗: {e}")
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+
+import discord
+
+from .message_payload import load_send_kwargs
+from .rate_limit import retry_rate_limited
+
+_logger = logging.getLogger(__name__)
+
+# 每批取出的私訊數量
+BATCH_SIZE = 50
+
+# 取出後的租約時間（秒），逾時未寫回結果的紀錄會被重新取出
+LEASE_SECONDS = 300
+
+# 批次仍在佇列中或發送中時，每隔此秒數延長租約
+LEASE_RENEW_INTERVAL = LEASE_SECONDS / 3
+
+# 沒有收到通知時定期檢查的間隔（秒），用於重試到期的私訊
+POLL_INTERVAL = 30
+
+
+class OutboxDrainer:
+    """
+    從 discord.dm.outbox 批次取出私訊交給 DMQueue 發送
+
+    Odoo 端 enqueue 後以 NOTIFY dm_outbox 喚醒；另每 POLL_INTERVAL 秒檢查一次重試到期的紀錄。
+    """
+
+    def __init__(self, bot, odoo_executor, dm_queue, batch_size: int = BATCH_SIZE):
+        self._bot = bot
+        self._odoo_executor = odoo_executor
+        self._dm_queue = dm_queue
+        self._batch_size = batch_size
+        self._loop = None
+        self._wake_event: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """啟動背景發送（需在 event loop 中呼叫），啟動時會先處理遺留的私訊"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        self._wake_event.set()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def wake(self):
+        """要求立即檢查寄件匣（thread-safe）"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake_event.clear()
+                try:
+                    await self._drain()
+                except Exception as e:
+                    _logger.error(f"處理私訊寄件匣失敗: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def _drain(self):
+        """持續取出批次直到寄件匣沒有可發送的紀錄"""
+        while True:
+            rows = await self._odoo_executor.run(self._claim, self._batch_size)
+            if not rows:
+                return
+
+            # 在全域速率限制下，批次可能在 DMQueue 中等待超過租約時間，發送完成前持續延長
+            in_flight = {row['id'] for row in rows}
+            renewer = asyncio.create_task(self._renew_leases(in_flight))
+            try:
+                results = await asyncio.gather(*(self._deliver(row, in_flight) for row in rows))
+            finally:
+                renewer.cancel()
+
+            sent_ids = [row['id'] for row, (ok, _, _) in zip(rows, results) if ok]
+            failures = [
+                (row['id'], error, permanent)
+                for row, (ok, error, permanent) in zip(rows, results) if not ok
+            ]
+            await self._odoo_executor.run(self._record, sent_ids, failures)
+            _logger.info(f"私訊寄件匣批次完成: 成功 {len(sent_ids)}，失敗 {len(failures)}")
+
+    @staticmethod
+    def _claim(env, limit):
+        return env['discord.dm.outbox']._claim_batch(limit, LEASE_SECONDS)
+
+    @staticmethod
+    def _record(env, sent_ids, failures):
+        env['discord.dm.outbox']._record_results(sent_ids, failures)
+
+    @staticmethod
+    def _renew(env, ids):
+        env['discord.dm.outbox']._renew_lease(ids, LEASE_SECONDS)
+
+    async def _renew_leases(self, in_flight: set):
+        """定期延長尚未發送完成的紀錄的租約"""
+        try:
+            while in_flight:
+                await asyncio.sleep(LEASE_RENEW_INTERVAL)
+                if not in_flight:
+                    return
+                try:
+                    await self._odoo_executor.run(self._renew, list(in_flight))
+                except Exception as e:
+                    _logger.error(f"延長私訊寄件匣租約失敗: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def _deliver(self, row: dict, in_flight: set) -> tuple:
+        """
+        發送一筆私訊
+
+        :return: (ok, error, permanent)
+        """
+        try:
+            return await self._send_row(row)
+        finally:
+            in_flight.discard(row['id'])
+
+    async def _send_row(self, row: dict) -> tuple:
+        try:
+            user = await self._bot.user_resolver.get_user(int(row['discord_id']))
+            future = await self._dm_queue.enqueue(
+                user, priority=row['priority'], **load_send_kwargs(row['payload'])
+            )
+            await future
+        except (discord.NotFound, discord.Forbidden) as e:
+            # 用戶不存在或關閉私訊，重試也不會成功
+            return False, str(e), True
+        except Exception as e:
+            return False, str(e), False
+
+        if row['delete_message_id'] and row['delete_channel_id']:
+            await self._delete_message(row['delete_channel_id'], row['delete_message_id'])
+        return True, None, False
+
+    async def _delete_message(self, channel_id: str, message_id: str):
+        """刪除原訊息（例如付款連結），以 ID 直接刪除，失敗不影響發送結果"""
+        try:
+            message = self._bot.user_resolver.get_partial_message(channel_id, message_id)
+            await retry_rate_limited(message.delete)
+            _logger.info(f"已刪除原訊息 {message_id}")
+        except discord.NotFound:
+            _logger.warning(f"找不到原訊息 {message_id}，可能已被刪除")
+        except discord.Forbidden:
+            _logger.warning(f"無權限刪除訊息 {message_id}")
+        except Exception as e:
+            _logger.error(f"刪除原訊息失敗: {e}")
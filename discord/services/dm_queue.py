@@ -6,8 +6,28 @@ from enum import IntEnum
 
 import discord
 
+from .message_payload import FrozenPayload
+
 _logger = logging.getLogger(__name__)
 
+# 預設並行發送的 worker 數量
+DEFAULT_WORKERS = 4
+
+# 預設全域速率：每 DEFAULT_RATE_PERIOD 秒最多 DEFAULT_RATE_LIMIT 則
+DEFAULT_RATE_LIMIT = 5
+DEFAULT_RATE_PERIOD = 5.0
+
+# 同一請求遇到 429 的最大重試次數
+MAX_RATE_LIMIT_RETRIES = 5
+
+# 429 回應未帶等待時間時的預設值（秒）
+DEFAULT_RETRY_AFTER = 5.0
+
+# 傳給 discord.py 的 max_ratelimit_timeout（秒，discord.py 允許的最小值）
+# 路由限制需等待超過此時間時 discord.py 拋出 RateLimited，由佇列延後該請求，不佔用 worker；
+# 較短的等待與全域限制由 discord.py 的 HTTP 層處理
+MAX_RATELIMIT_TIMEOUT = 30.0
+
 # 序列計數器，確保同優先度時按 FIFO 排序
 _sequence_counter = 0
 
@@ -32,27 +52,83 @@ class DMRequest:
     recipient: discord.abc.Snowflake = field(compare=False)
     kwargs: dict = field(compare=False)
     future: asyncio.Future = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+    # 群發時共用的預建參數，設定時忽略 kwargs
+    payload: FrozenPayload | None = field(default=None, compare=False)
+
+    @property
+    def route_key(self):
+        """DM 發送路由以 DM 頻道區分，每位接收者一個頻道"""
+        return getattr(self.recipient, 'id', None)
+
+
+class RouteBuckets:
+    """
+    追蹤各路由（DM 頻道）的速率限制
+
+    某一路由被限制時只延後該路由的請求，不影響其他接收者。
+    """
+
+    def __init__(self):
+        # {route_key: 解除限制的 monotonic 時間}
+        self._blocked_until = {}
+
+    def delay(self, route_key) -> float:
+        """取得該路由還需等待的秒數，0 表示可立即發送"""
+        until = self._blocked_until.get(route_key)
+        if until is None:
+            return 0.0
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            del self._blocked_until[route_key]
+            return 0.0
+        return remaining
+
+    def block(self, route_key, retry_after: float):
+        """記錄該路由被限制至 retry_after 秒後"""
+        self._blocked_until[route_key] = time.monotonic() + retry_after
+
+    def __len__(self):
+        return len(self._blocked_until)
 
 
 class DMQueue:
     """
     集中式 DM 佇列
 
-    所有私訊透過此佇列發送，支援優先度排序與速率限制。
+    所有私訊透過此佇列發送，支援優先度排序與速率限制：
+    - 多個 worker 並行發送，單一接收者回應緩慢不會卡住整個佇列
+    - 全域速率以 Token Bucket 控制，全域 429 由 discord.py 的 HTTP 層等待
+    - 路由限制超過 MAX_RATELIMIT_TIMEOUT 時（discord.RateLimited）只延後該路由的請求，
+      worker 繼續處理其他接收者
     """
 
-    def __init__(self, rate_limit: int = 5, rate_period: float = 5.0):
+    def __init__(self, rate_limit: int = DEFAULT_RATE_LIMIT,
+                 rate_period: float = DEFAULT_RATE_PERIOD,
+                 workers: int = DEFAULT_WORKERS):
         """
-        :param rate_limit: 時間窗口內允許的最大發送數量
+        :param rate_limit: 時間窗口內允許的最大發送數量（全域）
         :param rate_period: 時間窗口長度（秒）
+        :param workers: 並行發送的 worker 數量
         """
         self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
-        self._task: asyncio.Task | None = None
-        # Token Bucket 參數
-        self._rate_limit = rate_limit
+        self._workers = max(1, int(workers))
+        self._tasks: list[asyncio.Task] = []
+        self._loop = None
+        # 因路由限制而延後的請求
+        self._deferred: set[asyncio.TimerHandle] = set()
+        # 全域 Token Bucket 參數
+        self._rate_limit = max(1, int(rate_limit))
         self._rate_period = rate_period
-        self._tokens = float(rate_limit)
+        self._tokens = float(self._rate_limit)
         self._last_refill = time.monotonic()
+        self._global_lock = asyncio.Lock()
+        # 路由速率限制
+        self._routes = RouteBuckets()
+        # 統計資料
+        self._sent = 0
+        self._failed = 0
+        self._rate_limited = 0
 
     async def enqueue(self, recipient, priority=DMPriority.NORMAL, **kwargs) -> asyncio.Future:
         """
@@ -75,69 +151,155 @@ class DMQueue:
         await self._queue.put(request)
         return future
 
+    async def enqueue_many(self, recipients, priority=DMPriority.NORMAL,
+                           payload: FrozenPayload = None, **kwargs) -> list[asyncio.Future]:
+        """
+        將同一則訊息的多個 DM 請求一次加入佇列
+
+        所有請求共用同一份 FrozenPayload（未傳入時以 kwargs 建立），
+        Embed 只序列化一次，依傳入順序取得連續序號。
+
+        :param recipients: 接收者列表
+        :param priority: 優先度
+        :param payload: 預建的訊息參數
+        :param kwargs: content / embed / view
+        :return: 與 recipients 順序對應的 Future 列表
+        """
+        if payload is None:
+            payload = FrozenPayload(**kwargs)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for recipient in recipients:
+            future = loop.create_future()
+            self._queue.put_nowait(DMRequest(
+                priority=int(priority),
+                sequence=_next_sequence(),
+                recipient=recipient,
+                kwargs={},
+                future=future,
+                payload=payload,
+            ))
+            futures.append(future)
+        return futures
+
     def start(self):
         """啟動佇列消費者"""
-        if self._task is not None:
+        if self._tasks:
             return
-        self._task = asyncio.create_task(self._process())
-        _logger.info("DM 佇列處理器已啟動")
+        self._loop = asyncio.get_running_loop()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"DMQueueWorker-{i}")
+            for i in range(self._workers)
+        ]
+        _logger.info(f"DM 佇列處理器已啟動（{self._workers} 個 worker）")
 
     def stop(self):
         """停止佇列消費者"""
-        if self._task is not None:
-            self._task.cancel()
-            self._task = None
-            _logger.info("DM 佇列處理器已停止")
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for handle in self._deferred:
+            handle.cancel()
+        self._deferred.clear()
+        _logger.info("DM 佇列處理器已停止")
+
+    def stats(self) -> dict:
+        """取得佇列統計"""
+        return {
+            'workers': self._workers,
+            'queued': self._queue.qsize(),
+            'deferred': len(self._deferred),
+            'limited_routes': len(self._routes),
+            'sent': self._sent,
+            'failed': self._failed,
+            'rate_limited': self._rate_limited,
+        }
 
     async def _wait_for_token(self):
-        """Token Bucket 速率限制：等待直到有可用 token"""
-        while True:
-            now = time.monotonic()
-            elapsed = now - self._last_refill
-            self._tokens = min(
-                float(self._rate_limit),
-                self._tokens + elapsed * (self._rate_limit / self._rate_period),
-            )
-            self._last_refill = now
-
-            if self._tokens >= 1.0:
-                self._tokens -= 1.0
-                return
-
-            # 計算需等待多久才有 1 個 token
-            wait = (1.0 - self._tokens) / (self._rate_limit / self._rate_period)
-            await asyncio.sleep(wait)
-
-    async def _process(self):
+        """全域速率限制：等待直到有可用 token（worker 依序取得）"""
+        async with self._global_lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self._last_refill
+                self._tokens = min(
+                    float(self._rate_limit),
+                    self._tokens + elapsed * (self._rate_limit / self._rate_period),
+                )
+                self._last_refill = now
+
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+
+                # 計算需等待多久才有 1 個 token
+                wait = (1.0 - self._tokens) / (self._rate_limit / self._rate_period)
+                await asyncio.sleep(wait)
+
+    async def _worker(self):
         """持續從佇列取出並發送 DM"""
         try:
             while True:
                 request: DMRequest = await self._queue.get()
-
-                await self._wait_for_token()
-
                 try:
-                    result = await request.recipient.send(**request.kwargs)
-                    if not request.future.done():
-                        request.future.set_result(result)
-                except discord.HTTPException as e:
-                    if e.status == 429:
-                        # 速率限制，等待 retry_after 後重新入佇
-                        retry_after = getattr(e, 'retry_after', 5.0) or 5.0
-                        _logger.warning(f"DM 速率限制，{retry_after:.1f} 秒後重試")
-                        await asyncio.sleep(retry_after)
-                        # 重新入佇（不消耗新序號，維持原排序）
-                        await self._queue.put(request)
-                    else:
-                        _logger.error(f"發送 DM 給 {request.recipient} 失敗: {e}")
-                        if not request.future.done():
-                            request.future.set_exception(e)
-                except Exception as e:
-                    _logger.error(f"發送 DM 給 {request.recipient} 失敗: {e}")
-                    if not request.future.done():
-                        request.future.set_exception(e)
+                    # 路由仍在限制中：延後重新入佇，worker 繼續處理下一筆
+                    delay = self._routes.delay(request.route_key)
+                    if delay > 0:
+                        self._defer(request, delay)
+                        continue
+
+                    await self._wait_for_token()
+                    await self._send(request)
                 finally:
                     self._queue.task_done()
-
         except asyncio.CancelledError:
-            _logger.info("DM 佇列處理器已取消")
+            pass
+
+    async def _send(self, request: DMRequest):
+        try:
+            if request.payload is not None:
+                result = await request.payload.send(request.recipient)
+            else:
+                result = await request.recipient.send(**request.kwargs)
+            self._sent += 1
+            if not request.future.done():
+                request.future.set_result(result)
+        except discord.RateLimited as e:
+            self._on_rate_limited(request, e, e.retry_after)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                # discord.py 已重試仍被限制
+                self._on_rate_limited(request, e, DEFAULT_RETRY_AFTER)
+            else:
+                self._fail(request, e)
+        except Exception as e:
+            self._fail(request, e)
+
+    def _on_rate_limited(self, request: DMRequest, error: Exception, retry_after: float):
+        """延後該路由的請求，worker 繼續處理其他接收者"""
+        self._rate_limited += 1
+        request.attempts += 1
+        if request.attempts > MAX_RATE_LIMIT_RETRIES:
+            self._fail(request, error)
+            return
+
+        retry_after = max(float(retry_after or DEFAULT_RETRY_AFTER), 0.0)
+        self._routes.block(request.route_key, retry_after)
+        _logger.warning(f"DM 給 {request.recipient} 遇到速率限制，{retry_after:.1f} 秒後重試")
+        self._defer(request, retry_after)
+
+    def _defer(self, request: DMRequest, delay: float):
+        """延後 delay 秒重新入佇（不消耗新序號，維持原排序）"""
+        def _requeue():
+            self._deferred.discard(handle)
+            self._queue.put_nowait(request)
+
+        handle = self._loop.call_later(delay, _requeue)
+        self._deferred.add(handle)
+
+    def _fail(self, request: DMRequest, error: Exception):
+        self._failed += 1
+        _logger.error(f"發送 DM 給 {request.recipient} 失敗: {error}")
+        if not request.future.done():
+            request.future.set_exception(error)
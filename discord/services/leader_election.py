@@ -0,0 +1,203 @@
+import logging
+import os
+import select
+import socket
+import threading
+import time
+
+from odoo.sql_db import db_connect
+
+from .pg_notify import NOTIFY_CHANNEL
+
+_logger = logging.getLogger(__name__)
+
+# Postgres advisory lock key（'Discord' 的 ASCII）
+LEADER_LOCK_KEY = 0x446973636F7264
+
+# 心跳間隔（秒）
+HEARTBEAT_INTERVAL = 5.0
+
+# 未當選時重新嘗試取得鎖的間隔（秒），即 leader 失效後的最長接手時間
+ELECTION_INTERVAL = 5.0
+
+# 等待通知時最長的阻塞時間（秒），stop() 最晚在此時間內生效
+POLL_TIMEOUT = 1.0
+
+
+class LeaderElector:
+    """
+    以 Postgres session advisory lock 選出唯一執行 Discord gateway 的行程
+
+    - 持有鎖的連線中斷（行程結束、worker 被回收）時 Postgres 自動釋放鎖，
+      其他行程在 ELECTION_INTERVAL 內接手
+    - leader 每 HEARTBEAT_INTERVAL 秒更新 discord.bot.leader 的心跳資料（PID / 主機）
+    - 心跳寫入失敗視為失去 leadership，呼叫 on_demoted 後重新參選
+    - leader 以持有鎖的連線 LISTEN discord_bot 頻道，重啟等通知不依賴 gateway 是否已連線
+    """
+
+    def __init__(self, db_name: str, on_elected, on_demoted, on_notify=None, on_heartbeat=None):
+        """
+        :param db_name: Odoo 資料庫名稱
+        :param on_elected: 當選時呼叫（於選舉線程執行）
+        :param on_demoted: 失去 leadership 時呼叫（於選舉線程執行）
+        :param on_notify: leader 收到 discord_bot 通知時呼叫 on_notify(event)（於選舉線程執行）
+        :param on_heartbeat: leader 每次心跳後呼叫（於選舉線程執行），用於檢查 gateway 狀態
+        """
+        self._db_name = db_name
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._on_notify = on_notify
+        self._on_heartbeat = on_heartbeat
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._cr = None
+        self._is_leader = False
+        self.pid = os.getpid()
+        self.hostname = socket.gethostname()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def start(self):
+        """啟動選舉線程"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            daemon=True,
+            name="DiscordLeaderElection",
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """停止選舉並釋放鎖（不呼叫 on_demoted）"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    if self._try_acquire():
+                        self._lead()
+                    else:
+                        self._stop_event.wait(ELECTION_INTERVAL)
+                except Exception as e:
+                    _logger.error(f"Discord Bot leader election 失敗: {e}")
+                    self._step_down()
+                    self._stop_event.wait(ELECTION_INTERVAL)
+        finally:
+            self._release()
+
+    def _try_acquire(self) -> bool:
+        """嘗試取得 advisory lock"""
+        if self._cr is None:
+            self._cr = db_connect(self._db_name).cursor()
+        self._cr.execute("SELECT pg_try_advisory_lock(%s)", [LEADER_LOCK_KEY])
+        acquired = self._cr.fetchone()[0]
+        self._cr.commit()
+        return acquired
+
+    def _lead(self):
+        """當選後寫入心跳並處理通知，直到停止或連線失效"""
+        self._write_heartbeat(elected=True)
+        self._cr.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        self._cr.commit()
+        self._is_leader = True
+        _logger.info(f"本行程成為 Discord Bot leader (pid={self.pid}, host={self.hostname})")
+        self._on_elected()
+
+        next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL
+        while not self._stop_event.is_set():
+            timeout = next_heartbeat - time.monotonic()
+            if timeout > 0:
+                for event in self._wait_notifies(min(timeout, POLL_TIMEOUT)):
+                    self._call(self._on_notify, event)
+                continue
+            # 寫入失敗會拋出例外，由 _run 處理降級
+            self._write_heartbeat()
+            next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL
+            self._call(self._on_heartbeat)
+
+    def _wait_notifies(self, timeout: float) -> list:
+        """等待 discord_bot 通知，回傳不重複的事件名稱"""
+        conn = self._cr._cnx
+        if conn.notifies:
+            readable = True
+        else:
+            readable = bool(select.select([conn], [], [], timeout)[0])
+        if not readable:
+            return []
+        # 連線失效時拋出例外，由 _run 處理降級
+        conn.poll()
+        events = list(dict.fromkeys(notify.payload for notify in conn.notifies))
+        conn.notifies.clear()
+        return events
+
+    @staticmethod
+    def _call(callback, *args):
+        """呼叫 callback，例外只記錄不影響 leadership"""
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            _logger.error(f"Discord Bot leader 處理失敗: {e}")
+
+    def _write_heartbeat(self, elected: bool = False):
+        if elected:
+            self._cr.execute("""
+                INSERT INTO discord_bot_leader (name, pid, hostname, elected_at, heartbeat)
+                VALUES ('discord_bot', %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+                ON CONFLICT (name) DO UPDATE
+                   SET pid = EXCLUDED.pid,
+                       hostname = EXCLUDED.hostname,
+                       elected_at = EXCLUDED.elected_at,
+                       heartbeat = EXCLUDED.heartbeat
+            """, [self.pid, self.hostname])
+        else:
+            self._cr.execute("""
+                UPDATE discord_bot_leader
+                   SET heartbeat = now() at time zone 'UTC'
+                 WHERE name = 'discord_bot'
+            """)
+        self._cr.commit()
+
+    def _step_down(self):
+        """失去 leadership：通知服務停止 gateway 並丟棄連線"""
+        was_leader = self._is_leader
+        self._is_leader = False
+        if was_leader:
+            _logger.warning(f"本行程失去 Discord Bot leadership (pid={self.pid})")
+            # 先停止 gateway 再釋放鎖，避免與新 leader 短暫重疊
+            try:
+                self._on_demoted()
+            except Exception as e:
+                _logger.error(f"停止 Discord Bot 失敗: {e}")
+        self._close_cursor()
+
+    def _release(self):
+        """主動釋放鎖並關閉連線"""
+        self._is_leader = False
+        self._close_cursor()
+
+    def _close_cursor(self):
+        """釋放鎖後關閉 cursor，避免連線回到連線池時仍持有鎖"""
+        if self._cr is None:
+            return
+        try:
+            self._cr.execute("UNLISTEN *")
+            self._cr.execute("SELECT pg_advisory_unlock_all()")
+            self._cr.commit()
+        except Exception:
+            pass
+        try:
+            self._cr.close()
+        except Exception:
+            pass
+        self._cr = None
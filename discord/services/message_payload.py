@@ -0,0 +1,65 @@
+import discord
+from discord.http import handle_message_parameters
+from discord.utils import MISSING
+
+
+def dump_send_kwargs(send_kwargs: dict) -> dict:
+    """
+    將 send() kwargs 轉為可存入 JSON 欄位的格式
+
+    :param send_kwargs: render_message_by_type 的回傳值
+    :return: {'content': str, 'embed': dict}（僅包含有值的鍵）
+    """
+    payload = {}
+    if send_kwargs.get('content'):
+        payload['content'] = send_kwargs['content']
+    if send_kwargs.get('embed') is not None:
+        payload['embed'] = send_kwargs['embed'].to_dict()
+    return payload
+
+
+def load_send_kwargs(payload: dict) -> dict:
+    """將 dump_send_kwargs 的結果還原為 send() kwargs"""
+    kwargs = {}
+    if payload.get('content'):
+        kwargs['content'] = payload['content']
+    if payload.get('embed'):
+        kwargs['embed'] = discord.Embed.from_dict(payload['embed'])
+    return kwargs
+
+
+class FrozenPayload:
+    """
+    預先建立的訊息參數，群發時所有接收者共用
+
+    Embed 與 View 只在第一次發送時轉成 payload，之後每位接收者直接送出同一份 payload，
+    不再重新建立 Embed 或呼叫 to_dict()。建立後請勿修改傳入的 embed / view。
+    """
+
+    __slots__ = ('content', 'embed', 'view', '_params')
+
+    def __init__(self, content: str = None, embed: discord.Embed = None, view: discord.ui.View = None):
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self._params = None
+
+    def _get_params(self, state):
+        if self._params is None:
+            self._params = handle_message_parameters(
+                content=self.content if self.content else MISSING,
+                embed=self.embed if self.embed is not None else MISSING,
+                view=self.view if self.view is not None else MISSING,
+                previous_allowed_mentions=state.allowed_mentions,
+            )
+        return self._params
+
+    async def send(self, recipient) -> discord.Message:
+        """私訊給 recipient，回傳值與 recipient.send() 相同"""
+        channel = recipient.dm_channel or await recipient.create_dm()
+        state = channel._state
+        data = await state.http.send_message(channel.id, params=self._get_params(state))
+        message = state.create_message(channel=channel, data=data)
+        if self.view is not None and not self.view.is_finished() and self.view.is_dispatchable():
+            state.store_view(self.view, message.id)
+        return message
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import odoo
+from odoo import api
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+# 預設線程池大小
+DEFAULT_POOL_SIZE = 4
+
+# 等待時間超過此值（秒）時記錄警告，提示需要加大線程池
+SLOW_WAIT_THRESHOLD = 1.0
+
+
+@contextmanager
+def odoo_env(db_name: str):
+    """Context manager 取得 Odoo Environment，自動處理 commit/close"""
+    reg = Registry(db_name)
+    cr = reg.cursor()
+    try:
+        env = api.Environment(cr, odoo.SUPERUSER_ID, {})
+        yield env
+        cr.commit()
+    except Exception:
+        cr.rollback()
+        raise
+    finally:
+        cr.close()
+
+
+class OdooExecutor:
+    """
+    Odoo ORM 執行器
+
+    在獨立的有界線程池中執行資料庫操作，避免慢查詢阻塞 Discord event loop
+    （gateway heartbeat 與其他伺服器的訊息處理）。
+    """
+
+    def __init__(self, db_name: str, max_workers: int = DEFAULT_POOL_SIZE):
+        """
+        :param db_name: Odoo 資料庫名稱
+        :param max_workers: 線程池大小
+        """
+        self._db_name = db_name
+        self._max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix='DiscordOdoo',
+        )
+        # 統計資料
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queued = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def run(self, fn, *args):
+        """
+        在線程池中以新的 Odoo Environment 執行 fn(env, *args)
+
+        :param fn: 同步函式，第一個參數為 env
+        :return: fn 的回傳值
+        """
+        loop = asyncio.get_running_loop()
+        with self._stats_lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        try:
+            future = loop.run_in_executor(
+                self._executor, self._call, time.monotonic(), fn, args
+            )
+        except BaseException:
+            # 提交失敗（例如線程池已關閉）時 _call 不會執行，需在此還原統計
+            with self._stats_lock:
+                self._queued -= 1
+            raise
+        return await future
+
+    def _call(self, submitted_at: float, fn, args):
+        """於工作線程中執行，記錄等待時間後開啟 cursor"""
+        wait = time.monotonic() - submitted_at
+        with self._stats_lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+
+        if wait > SLOW_WAIT_THRESHOLD:
+            _logger.warning(
+                f"Odoo 線程池等待 {wait:.2f} 秒才開始執行 {getattr(fn, '__qualname__', fn)}，"
+                f"請考慮加大 discord.odoo_pool_size（目前 {self._max_workers}）"
+            )
+
+        success = False
+        try:
+            with odoo_env(self._db_name) as env:
+                result = fn(env, *args)
+            success = True
+            return result
+        finally:
+            with self._stats_lock:
+                self._running -= 1
+                if success:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+
+    def stats(self) -> dict:
+        """取得線程池統計（佇列深度、等待時間）"""
+        with self._stats_lock:
+            started = self._completed + self._failed + self._running
+            return {
+                'pool_size': self._max_workers,
+                'queued': self._queued,
+                'running': self._running,
+                'max_queued': self._max_queued,
+                'completed': self._completed,
+                'failed': self._failed,
+                'avg_wait': (self._total_wait / started) if started else 0.0,
+                'max_wait': self._max_wait,
+            }
+
+    def shutdown(self):
+        """關閉線程池（不等待執行中的工作）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
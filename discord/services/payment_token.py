@@ -0,0 +1,107 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass
+
+# 付款連結有效時間（秒）
+TOKEN_TTL = 24 * 3600
+
+# 由 database.secret 衍生付款連結專用金鑰時使用的用途標籤
+_KEY_PURPOSE = b'discord.payment_token'
+
+# {database.secret: 衍生金鑰}
+_derived_keys = {}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def derive_key(db_secret: str) -> bytes:
+    """由 database.secret 衍生簽章金鑰（結果快取）"""
+    key = _derived_keys.get(db_secret)
+    if key is None:
+        key = hmac.new(db_secret.encode('utf-8'), _KEY_PURPOSE, hashlib.sha256).digest()
+        _derived_keys[db_secret] = key
+    return key
+
+
+@dataclass(frozen=True)
+class PaymentToken:
+    """付款連結內容"""
+    discord_id: str
+    points: int
+    price: int
+    nonce: str
+    expires_at: int
+    display_name: str = ''
+
+    @property
+    def amount(self) -> int:
+        return self.points * self.price
+
+
+def sign(key: bytes, discord_id: str, points: int, price: int, nonce: str,
+         expires_at: int, display_name: str = '') -> str:
+    """
+    產生付款連結 token
+
+    :param key: derive_key() 的結果
+    :param price: 產生連結時的點數單價，付款時依此計價
+    :param nonce: 付款連結識別碼，用於找回付款訊息與防止重複使用
+    :param expires_at: 到期時間（Unix timestamp）
+    :param display_name: 付款頁面顯示的名稱
+    """
+    payload = json.dumps({
+        'd': str(discord_id),
+        'p': int(points),
+        'u': int(price),
+        'n': nonce,
+        'e': int(expires_at),
+        'm': display_name,
+    }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    signature = hmac.new(key, payload, hashlib.sha256).digest()
+    return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+
+def verify(key: bytes, token: str) -> PaymentToken | None:
+    """
+    驗證付款連結 token
+
+    :return: PaymentToken，簽章錯誤、格式錯誤或已過期時回傳 None
+    """
+    if not token or token.count('.') != 1:
+        return None
+    payload_part, signature_part = token.split('.')
+    try:
+        payload = _b64decode(payload_part)
+        signature = _b64decode(signature_part)
+    except ValueError:
+        return None
+
+    expected = hmac.new(key, payload, hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        return None
+
+    try:
+        data = json.loads(payload)
+        result = PaymentToken(
+            discord_id=str(data['d']),
+            points=int(data['p']),
+            price=int(data['u']),
+            nonce=str(data['n']),
+            expires_at=int(data['e']),
+            display_name=str(data.get('m') or ''),
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if result.expires_at < time.time() or result.points <= 0 or result.price <= 0:
+        return None
+    return result
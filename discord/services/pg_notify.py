@@ -0,0 +1,134 @@
+import asyncio
+import logging
+
+from odoo.sql_db import db_connect
+
+_logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY 頻道名稱
+NOTIFY_CHANNEL = 'discord_bot'
+
+# 連線中斷後重新連線的等待時間（秒）
+RECONNECT_DELAY = 5.0
+
+
+def notify_bot(cr, event: str):
+    """
+    發送 NOTIFY 給所有 Odoo 行程中的 Bot
+
+    NOTIFY 隨交易提交才送出，rollback 時不會送出，因此 Bot 收到時資料已可讀取。
+
+    :param cr: Odoo cursor
+    :param event: 事件名稱，例如 'config'
+    """
+    cr.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, event])
+
+
+class NotifyListener:
+    """
+    在 Bot 的 event loop 中 LISTEN discord_bot 頻道
+
+    收到通知時依事件名稱呼叫 handler；連線中斷時自動重連，
+    重連成功後會呼叫 resync_events 的 handler，補上斷線期間可能遺漏的通知。
+    """
+
+    def __init__(self, db_name: str, handlers: dict, resync_events=()):
+        """
+        :param db_name: Odoo 資料庫名稱
+        :param handlers: {event: callable()}
+        :param resync_events: 重連後要重新執行的事件，只應包含重新同步狀態的 handler（不含 restart 等動作）
+        """
+        self._db_name = db_name
+        self._handlers = handlers
+        self._resync_events = tuple(resync_events)
+        self._loop = None
+        self._cr = None
+        self._conn = None
+        self._reconnect_handle = None
+        self._stopped = False
+
+    def start(self):
+        """開始監聽（需在 event loop 中呼叫）"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = False
+        self._connect(initial=True)
+
+    def stop(self):
+        """停止監聽並釋放連線"""
+        self._stopped = True
+        if self._reconnect_handle:
+            self._reconnect_handle.cancel()
+            self._reconnect_handle = None
+        self._disconnect()
+
+    def _connect(self, initial=False):
+        self._reconnect_handle = None
+        if self._stopped:
+            return
+        try:
+            self._cr = db_connect(self._db_name).cursor()
+            self._conn = self._cr._cnx
+            self._cr.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            self._cr.commit()
+            self._loop.add_reader(self._conn.fileno(), self._on_readable)
+            _logger.info(f"已開始監聽 Postgres 通知頻道 {NOTIFY_CHANNEL}")
+        except Exception as e:
+            _logger.error(f"監聽 Postgres 通知失敗，{RECONNECT_DELAY:.0f} 秒後重試: {e}")
+            self._disconnect()
+            self._schedule_reconnect()
+            return
+
+        if not initial:
+            # 斷線期間可能遺漏通知，重新同步狀態
+            for event in self._resync_events:
+                handler = self._handlers.get(event)
+                if handler:
+                    self._call(handler)
+
+    def _disconnect(self):
+        if self._conn is not None:
+            try:
+                self._loop.remove_reader(self._conn.fileno())
+            except Exception:
+                pass
+        if self._cr is not None:
+            try:
+                self._cr.execute(f"UNLISTEN {NOTIFY_CHANNEL}")
+                self._cr.commit()
+            except Exception:
+                pass
+            try:
+                self._cr.close()
+            except Exception:
+                pass
+        self._cr = None
+        self._conn = None
+
+    def _schedule_reconnect(self):
+        if self._stopped or self._reconnect_handle is not None:
+            return
+        self._reconnect_handle = self._loop.call_later(RECONNECT_DELAY, self._connect)
+
+    def _on_readable(self):
+        try:
+            self._conn.poll()
+        except Exception as e:
+            _logger.warning(f"Postgres 通知連線中斷: {e}")
+            self._disconnect()
+            self._schedule_reconnect()
+            return
+
+        # 同一事件在一次 poll 中只處理一次
+        events = {n.payload for n in self._conn.notifies}
+        self._conn.notifies.clear()
+        for event in events:
+            handler = self._handlers.get(event)
+            if handler:
+                self._call(handler)
+
+    @staticmethod
+    def _call(handler):
+        try:
+            handler()
+        except Exception as e:
+            _logger.error(f"處理 Postgres 通知失敗: {e}")
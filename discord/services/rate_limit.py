@@ -0,0 +1,31 @@
+import asyncio
+import logging
+
+import discord
+
+_logger = logging.getLogger(__name__)
+
+# 遇到 RateLimited 的最大重試次數
+MAX_RETRIES = 3
+
+
+async def retry_rate_limited(fn, *args, retries: int = MAX_RETRIES, **kwargs):
+    """
+    呼叫 Discord REST 並在 discord.RateLimited 時等待後重試
+
+    Bot 設定了 max_ratelimit_timeout，等待時間較長的 429 會拋出 RateLimited 而不是在 HTTP 層等待；
+    DM 由 DMQueue 延後處理，其他呼叫（頻道訊息、刪除訊息、取得使用者）經由此函式維持原本等待的行為。
+
+    :param fn: 回傳 coroutine 的函式，例如 channel.send
+    :return: fn 的回傳值
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await fn(*args, **kwargs)
+        except discord.RateLimited as e:
+            if attempt >= retries:
+                raise
+            _logger.warning(
+                f"{getattr(fn, '__qualname__', fn)} 遇到速率限制，{e.retry_after:.1f} 秒後重試"
+            )
+            await asyncio.sleep(e.retry_after)
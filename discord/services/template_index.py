@@ -0,0 +1,143 @@
+import logging
+import random
+from dataclasses import dataclass
+from itertools import accumulate
+from types import MappingProxyType
+
+import discord
+from jinja2 import Environment
+
+_logger = logging.getLogger(__name__)
+
+# 模板中可使用 Jinja2 的欄位
+JINJA_FIELDS = ('body', 'embed_title', 'embed_image_url', 'embed_thumbnail_url', 'embed_footer')
+
+_jinja_env = Environment()
+
+
+def parse_color(hex_color: str | None) -> discord.Colour | None:
+    """解析 Hex 色碼，例如 #FF5733"""
+    if not hex_color:
+        return None
+    hex_str = hex_color.strip().lstrip('#')
+    try:
+        return discord.Colour(int(hex_str, 16))
+    except ValueError:
+        _logger.warning(f"無效的 Embed 顏色: {hex_color}")
+        return None
+
+
+def build_message(use_embed: bool, body: str, color: discord.Colour | None = None,
+                  title: str = None, image_url: str = None,
+                  thumbnail_url: str = None, footer: str = None) -> dict:
+    """
+    以渲染後的欄位組出 send() kwargs
+
+    :return: {'content': ...} 或 {'embed': discord.Embed(...)}
+    """
+    if not use_embed:
+        return {'content': body}
+
+    embed = discord.Embed(description=body, color=color)
+    if title:
+        embed.title = title
+    if image_url:
+        embed.set_image(url=image_url)
+    if thumbnail_url:
+        embed.set_thumbnail(url=thumbnail_url)
+    if footer:
+        embed.set_footer(text=footer)
+    return {'embed': embed}
+
+
+@dataclass(frozen=True)
+class TemplateVariant:
+    """單一模板（已編譯）"""
+    id: int
+    use_embed: bool
+    color: discord.Colour | None
+    weight: int
+    # {欄位: (原始字串, 編譯後模板)}，空欄位不存在
+    fields: MappingProxyType
+
+    @classmethod
+    def from_row(cls, row: dict) -> 'TemplateVariant':
+        """由 discord_message_template 的欄位值建立並編譯"""
+        compiled = {}
+        for name in JINJA_FIELDS:
+            source = row.get(name)
+            if not source:
+                continue
+            try:
+                compiled[name] = (source, _jinja_env.from_string(source))
+            except Exception as e:
+                _logger.error(f"編譯模板 {row.get('id')} 的 {name} 失敗: {e}")
+                compiled[name] = (source, None)
+        return cls(
+            id=row['id'],
+            use_embed=bool(row.get('use_embed')),
+            color=parse_color(row.get('embed_color')),
+            weight=max(int(row.get('weight') or 1), 1),
+            fields=MappingProxyType(compiled),
+        )
+
+    def _render(self, name: str, values: dict) -> str | None:
+        entry = self.fields.get(name)
+        if entry is None:
+            return None
+        source, template = entry
+        if template is None:
+            return source
+        try:
+            return template.render(**values)
+        except Exception as e:
+            _logger.error(f"Jinja2 渲染失敗: {e}")
+            return source
+
+    def render_message(self, values: dict) -> dict:
+        """渲染為 send() kwargs"""
+        return build_message(
+            self.use_embed,
+            self._render('body', values) or '',
+            color=self.color,
+            title=self._render('embed_title', values),
+            image_url=self._render('embed_image_url', values),
+            thumbnail_url=self._render('embed_thumbnail_url', values),
+            footer=self._render('embed_footer', values),
+        )
+
+
+@dataclass(frozen=True)
+class TemplateVariants:
+    """同一類型的所有啟用模板，依權重隨機選用"""
+    variants: tuple
+    cum_weights: tuple
+
+    @classmethod
+    def build(cls, variants: list) -> 'TemplateVariants':
+        variants = tuple(variants)
+        return cls(
+            variants=variants,
+            cum_weights=tuple(accumulate(v.weight for v in variants)),
+        )
+
+    def pick(self) -> TemplateVariant:
+        if len(self.variants) == 1:
+            return self.variants[0]
+        return random.choices(self.variants, cum_weights=self.cum_weights)[0]
+
+
+def build_index(rows: list) -> MappingProxyType:
+    """
+    建立模板索引
+
+    :param rows: 啟用中的模板欄位值
+    :return: {template_type: TemplateVariants}
+    """
+    by_type = {}
+    for row in rows:
+        by_type.setdefault(row['template_type'], []).append(TemplateVariant.from_row(row))
+    return MappingProxyType({
+        template_type: TemplateVariants.build(variants)
+        for template_type, variants in by_type.items()
+    })
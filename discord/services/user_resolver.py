@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from .rate_limit import retry_rate_limited
+
+_logger = logging.getLogger(__name__)
+
+# 最近以 REST 取得的使用者數量上限
+DEFAULT_CACHE_SIZE = 5000
+
+
+class UserResolver:
+    """
+    Discord 使用者 / 訊息解析
+
+    依序查詢 gateway 快取（get_user）、最近以 REST 取得的使用者（LRU），最後才呼叫 fetch_user；
+    同一使用者同時解析時只發出一次 REST 請求。
+    訊息以 PartialMessageable 建立，不需 fetch_channel / fetch_message 即可刪除或編輯。
+    """
+
+    def __init__(self, bot, cache_size: int = DEFAULT_CACHE_SIZE):
+        self._bot = bot
+        self._cache_size = cache_size
+        # {user_id: discord.User}
+        self._users = OrderedDict()
+        # {user_id: asyncio.Future} 進行中的 fetch_user
+        self._fetching = {}
+        self._hits = 0
+        self._fetches = 0
+
+    async def get_user(self, user_id: int):
+        """
+        取得使用者
+
+        :raises discord.NotFound: 使用者不存在
+        :raises discord.HTTPException: REST 請求失敗
+        """
+        user_id = int(user_id)
+        user = self._bot.get_user(user_id)
+        if user is not None:
+            return user
+
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+            self._hits += 1
+            return user
+
+        future = self._fetching.get(user_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._fetching[user_id] = future
+        try:
+            self._fetches += 1
+            user = await retry_rate_limited(self._bot.fetch_user, user_id)
+        except Exception as e:
+            future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(user)
+        finally:
+            self._fetching.pop(user_id, None)
+            if not future.done():
+                future.cancel()
+
+        self._users[user_id] = user
+        while len(self._users) > self._cache_size:
+            self._users.popitem(last=False)
+        return user
+
+    def get_partial_message(self, channel_id: int, message_id: int):
+        """以 ID 建立訊息物件（不發出 REST 請求），可直接 delete() / edit()"""
+        return self._bot.get_partial_messageable(int(channel_id)).get_partial_message(int(message_id))
+
+    def stats(self) -> dict:
+        return {
+            'cached': len(self._users),
+            'hits': self._hits,
+            'fetches': self._fetches,
+        }